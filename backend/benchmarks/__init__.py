@@ -0,0 +1,9 @@
+# benchmarks/__init__.py
+"""Synthetic dataset generator and query benchmarks.
+
+    python -m benchmarks.generate_dataset --out /data/bench --days 31
+    python -m benchmarks.run_benchmarks --data /data/bench --out baseline.json
+    python -m benchmarks.run_benchmarks --data /data/bench --compare baseline.json
+
+Run both from the backend directory.
+"""
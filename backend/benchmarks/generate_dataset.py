@@ -0,0 +1,118 @@
+# benchmarks/generate_dataset.py
+"""Generate a synthetic BESS parquet tree shaped like the production share.
+
+    <out>/site=<site>/year=YYYY/month=MM/day=DD/equipment=<eq>/dcu=<n>/part-<k>.parquet
+
+Every sampling instant has one row per (n_bank, n_rack). n_soc follows a
+daily charge/discharge cycle, n_voltage tracks it and n_current is its
+slope, each with deterministic noise, so the same arguments always produce
+the same files. A dataset.json manifest next to the site directory
+describes the tree for run_benchmarks.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+import duckdb
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "dataset.json"
+
+def _leaf_sql(day: date, dcu: int, part: int, parts: int, args) -> str:
+    """SELECT producing one part file of one (day, equipment, dcu) leaf"""
+    samples_per_day = 86400 // args.interval
+    first, last = samples_per_day * part // parts, samples_per_day * (part + 1) // parts
+    noise = f"((hash(s * 7919 + n_bank * 131 + n_rack * 17 + {dcu} * 7 + {args.seed}) % 2000) / 1000.0 - 1.0)"
+    phase = f"2 * pi() * (s * {args.interval} / 86400.0 - 0.25)"
+    return f"""
+        SELECT TIMESTAMP '{day.isoformat()}' + to_seconds(s * {args.interval}) AS t_sampling_time,
+               n_bank::INTEGER AS n_bank,
+               n_rack::INTEGER AS n_rack,
+               round(55 + 35 * sin({phase}) - 0.4 * n_rack + 0.3 * {dcu} + {noise}, 2) AS n_soc,
+               round(760 + 1.6 * (55 + 35 * sin({phase})) + 2 * {noise}, 2) AS n_voltage,
+               round(120 * cos({phase}) + 4 * {noise}, 2) AS n_current,
+               round(24 + 6 * sin({phase} - 1) + 0.2 * n_rack + 0.5 * {noise}, 2) AS n_temperature
+        FROM range({first}, {last}) r(s),
+             range(1, {args.banks + 1}) b(n_bank),
+             range(1, {args.racks + 1}) k(n_rack)
+        ORDER BY t_sampling_time, n_bank, n_rack
+    """
+
+def generate(args) -> Dict[str, Any]:
+    base_path = os.path.join(args.out, f"site={args.site}")
+    start = date.fromisoformat(args.start)
+    con = duckdb.connect()
+    files: List[str] = []
+    started = time.perf_counter()
+
+    for offset in range(args.days):
+        day = start + timedelta(days=offset)
+        for equipment in args.equipment:
+            for dcu in range(1, args.dcus + 1):
+                leaf = os.path.join(base_path, f"year={day.year}", f"month={day.month:02d}",
+                                    f"day={day.day:02d}", f"equipment={equipment}", f"dcu={dcu}")
+                os.makedirs(leaf, exist_ok=True)
+                for part in range(args.files_per_leaf):
+                    path = os.path.join(leaf, f"part-{part}.parquet")
+                    if os.path.exists(path) and not args.force:
+                        files.append(path)
+                        continue
+                    con.execute(f"""COPY ({_leaf_sql(day, dcu, part, args.files_per_leaf, args)})
+                                    TO '{path}' (FORMAT parquet, ROW_GROUP_SIZE {args.row_group_size})""")
+                    files.append(path)
+        logger.info(f"Generated {day.isoformat()} ({offset + 1}/{args.days})")
+
+    rows = con.execute("SELECT SUM(num_rows) FROM parquet_file_metadata($files)", {"files": files}).fetchone()[0]
+    manifest = {
+        "base_path": os.path.abspath(base_path),
+        "site": args.site,
+        "start": start.isoformat(),
+        "days": args.days,
+        "equipment": args.equipment,
+        "dcus": args.dcus,
+        "banks": args.banks,
+        "racks": args.racks,
+        "interval_seconds": args.interval,
+        "files_per_leaf": args.files_per_leaf,
+        "files": len(files),
+        "rows": int(rows or 0),
+        "bytes": sum(os.path.getsize(f) for f in files),
+        "metrics": ["n_soc", "n_voltage", "n_current", "n_temperature"],
+        "seed": args.seed
+    }
+    with open(os.path.join(args.out, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Dataset ready in {time.perf_counter() - started:.1f}s: "
+                f"{manifest['files']} files, {manifest['rows']} rows, {manifest['bytes'] / 1e6:.1f} MB")
+    return manifest
+
+def load_manifest(data_dir: str) -> Dict[str, Any]:
+    with open(os.path.join(data_dir, MANIFEST)) as f:
+        return json.load(f)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic hive-partitioned BESS parquet tree")
+    parser.add_argument("--out", required=True, help="Output directory (the site= directory goes inside)")
+    parser.add_argument("--site", default="UK_Tollgate")
+    parser.add_argument("--start", default="2025-01-01", help="First day (YYYY-MM-DD)")
+    parser.add_argument("--days", type=int, default=31)
+    parser.add_argument("--equipment", type=lambda s: s.split(","), default=["bsc"], help="Comma-separated equipment names")
+    parser.add_argument("--dcus", type=int, default=2, help="DCUs per equipment")
+    parser.add_argument("--banks", type=int, default=2)
+    parser.add_argument("--racks", type=int, default=4, help="Racks per bank")
+    parser.add_argument("--interval", type=int, default=10, help="Sampling interval in seconds")
+    parser.add_argument("--files-per-leaf", type=int, default=1, help="Part files per day/equipment/dcu")
+    parser.add_argument("--row-group-size", type=int, default=122880)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--force", action="store_true", help="Rewrite files that already exist")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    generate(parse_args())
@@ -0,0 +1,267 @@
+# benchmarks/load_test.py
+"""Concurrent dashboard load test against the in-process FastAPI app.
+
+Each simulated user behaves like the UI:
+
+    - opens a DynamicPage: GET /pages/, then one POST /query?format=columnar
+      per widget (WidgetBox payload: equipment, dcu, one metric, width_px)
+    - live refresh: every --refresh seconds each widget asks only for the
+      buckets since its last one (the `since` tail request)
+    - globalTime change: the page switches to another day or range and every
+      widget reloads
+    - data source page visit: GET /datasources/, /equipments, then health and
+      mappings of one source, like DataSourcePage.vue
+
+Requests go through httpx's ASGITransport, so no server or network is
+involved and the numbers are the app's own latency under concurrency.
+Run it against a tree from benchmarks.generate_dataset:
+
+    python -m benchmarks.load_test --data /data/bench --users 20 --widgets 6 --duration 60
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks.generate_dataset import load_manifest
+from benchmarks.run_benchmarks import _configure_environment
+
+logger = logging.getLogger(__name__)
+
+# globalTime choices: (range length, weight); a day is what the picker sets by default
+TIME_RANGES = [(timedelta(hours=1), 2), (timedelta(days=1), 5), (timedelta(days=7), 2), (timedelta(days=30), 1)]
+
+class Recorder:
+    """Latencies and outcomes per endpoint"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def call(self, client: httpx.AsyncClient, label: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except Exception as e:
+            self.latencies[label].append(time.perf_counter() - started)
+            self.errors[label] += 1
+            logger.debug(f"{label} failed: {e!r}")
+            return None
+        self.latencies[label].append(time.perf_counter() - started)
+        self.statuses[label][response.status_code] += 1
+        if response.status_code >= 400:
+            self.errors[label] += 1
+            return None
+        return response
+
+    def report(self, elapsed: float) -> List[Dict[str, Any]]:
+        rows = []
+        for label in sorted(self.latencies):
+            samples = sorted(self.latencies[label])
+            pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]
+            rows.append({
+                "endpoint": label,
+                "requests": len(samples),
+                "throughput_rps": round(len(samples) / elapsed, 2),
+                "p50_ms": round(statistics.median(samples) * 1000, 1),
+                "p95_ms": round(pick(0.95) * 1000, 1),
+                "p99_ms": round(pick(0.99) * 1000, 1),
+                "max_ms": round(samples[-1] * 1000, 1),
+                "error_rate": round(self.errors[label] / len(samples), 4),
+                "statuses": dict(self.statuses[label])
+            })
+        return rows
+
+class DashboardUser:
+    """One operator with a DynamicPage of widgets open"""
+
+    def __init__(self, user_id: int, client: httpx.AsyncClient, recorder: Recorder, manifest: Dict[str, Any],
+                 source_id: Optional[str], args):
+        self.user_id = user_id
+        self.client = client
+        self.recorder = recorder
+        self.manifest = manifest
+        self.source_id = source_id
+        self.args = args
+        self.rng = random.Random(args.seed + user_id)
+        self.first_day = datetime.fromisoformat(manifest["start"])
+        self.widgets = [self._widget() for _ in range(args.widgets)]
+        self.global_time = self._pick_time_range()
+
+    def _widget(self) -> Dict[str, Any]:
+        return {
+            "equipment": self.rng.choice(self.manifest["equipment"]),
+            "dcu": self.rng.randint(1, self.manifest["dcus"]),
+            "metric": self.rng.choice(self.manifest["metrics"]),
+            "filter": self.rng.choice(["n_bank", "n_rack"]),
+            "width_px": self.rng.choice([400, 600, 900, 1200]),
+            "last_bucket": None
+        }
+
+    def _pick_time_range(self):
+        span = self.rng.choices([r for r, _ in TIME_RANGES], weights=[w for _, w in TIME_RANGES])[0]
+        span = min(span, timedelta(days=self.manifest["days"]))
+        last_start = self.manifest["days"] * 86400 - int(span.total_seconds())
+        # Start on an hour, as the time picker does
+        start = self.first_day + timedelta(hours=self.rng.randint(0, max(0, last_start) // 3600))
+        return start, start + span - timedelta(seconds=1)
+
+    def _payload(self, widget: Dict[str, Any], tail: bool = False) -> Dict[str, Any]:
+        start, end = self.global_time
+        payload = {
+            "year": start.year, "month": None, "day": None,
+            "equipment": widget["equipment"],
+            "dcu": widget["dcu"],
+            "start_time": start.isoformat(),
+            "end_time": end.isoformat(),
+            "metrics": [widget["metric"]],
+            "window_period": None,
+            "width_px": widget["width_px"],
+            "where_args": [f"{widget['filter']}=1"]
+        }
+        if tail and widget["last_bucket"]:
+            payload["since"] = widget["last_bucket"]
+        return payload
+
+    async def _load_widget(self, widget: Dict[str, Any], tail: bool = False):
+        label = "POST /query (tail)" if tail and widget["last_bucket"] else "POST /query"
+        response = await self.recorder.call(self.client, label, "POST", "/query", params={"format": "columnar"},
+                                            json=self._payload(widget, tail))
+        if response is not None:
+            timestamps = response.json().get("timestamps") or []
+            if timestamps:
+                widget["last_bucket"] = timestamps[-1]
+
+    async def _load_page(self, tail: bool = False):
+        # Widgets fetch concurrently, as each WidgetBox does on mount
+        await asyncio.gather(*(self._load_widget(w, tail) for w in self.widgets))
+
+    async def _visit_data_sources(self):
+        await asyncio.gather(
+            self.recorder.call(self.client, "GET /datasources/", "GET", "/datasources/"),
+            self.recorder.call(self.client, "GET /equipments", "GET", "/equipments")
+        )
+        if self.source_id:
+            await asyncio.gather(
+                self.recorder.call(self.client, "GET /datasources/{id}/health", "GET", f"/datasources/{self.source_id}/health"),
+                self.recorder.call(self.client, "GET /datasources/{id}/mappings", "GET", f"/datasources/{self.source_id}/mappings")
+            )
+
+    async def run(self, deadline: float):
+        # Stagger arrivals so users don't all open the page in the same instant
+        await asyncio.sleep(self.rng.uniform(0, self.args.ramp_up))
+        await self.recorder.call(self.client, "GET /pages/", "GET", "/pages/")
+        await self._load_page()
+        next_refresh = time.monotonic() + self.args.refresh
+
+        while time.monotonic() < deadline:
+            await asyncio.sleep(min(self.rng.expovariate(1 / self.args.think), max(0.0, deadline - time.monotonic())))
+            if time.monotonic() >= deadline:
+                break
+            if time.monotonic() >= next_refresh:
+                await self._load_page(tail=True)
+                next_refresh = time.monotonic() + self.args.refresh
+                continue
+            action = self.rng.random()
+            if action < self.args.time_change_rate:
+                self.global_time = self._pick_time_range()
+                for widget in self.widgets:
+                    widget["last_bucket"] = None
+                await self._load_page()
+            elif action < self.args.time_change_rate + self.args.datasource_rate:
+                await self._visit_data_sources()
+
+async def _register_source(client: httpx.AsyncClient, manifest: Dict[str, Any]) -> Optional[str]:
+    """Make sure the synthetic tree exists as a parquet data source for the data source page"""
+    response = await client.get("/datasources/")
+    for source in response.json() if response.status_code == 200 else []:
+        if source.get("source_name") == "load-test":
+            return source["source_id"]
+    response = await client.post("/datasources/", json={
+        "source_name": "load-test",
+        "source_type": "parquet",
+        "connection_config": {"base_path": manifest["base_path"], "path_pattern": "**/*.parquet"}
+    })
+    if response.status_code != 200:
+        logger.warning(f"Could not register the load-test data source: {response.text[:200]}")
+        return None
+    return response.json()["source_id"]
+
+async def run(args) -> Dict[str, Any]:
+    manifest = load_manifest(args.data)
+    _configure_environment(args.data, manifest)
+    import main
+
+    recorder = Recorder()
+    transport = httpx.ASGITransport(app=main.app)
+    # ASGITransport does not send lifespan events, so start the app's resources here
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout) as client:
+            source_id = await _register_source(client, manifest)
+            users = [DashboardUser(i, client, recorder, manifest, source_id, args) for i in range(args.users)]
+            started = time.monotonic()
+            deadline = started + args.duration
+            await asyncio.gather(*(user.run(deadline) for user in users))
+            elapsed = time.monotonic() - started
+
+    total = sum(len(v) for v in recorder.latencies.values())
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "users": args.users,
+            "widgets": args.widgets,
+            "duration_s": round(elapsed, 1),
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "errors": sum(recorder.errors.values()),
+            "dataset": {k: manifest[k] for k in ("days", "equipment", "dcus", "files", "rows")}
+        },
+        "endpoints": recorder.report(elapsed)
+    }
+
+def print_report(report: Dict[str, Any]):
+    meta = report["meta"]
+    print(f"{meta['users']} users x {meta['widgets']} widgets for {meta['duration_s']}s: "
+          f"{meta['requests']} requests, {meta['throughput_rps']} req/s, {meta['errors']} errors")
+    print(f"{'endpoint':<34}{'reqs':>7}{'req/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>9}")
+    for row in report["endpoints"]:
+        print(f"{row['endpoint']:<34}{row['requests']:>7}{row['throughput_rps']:>8.2f}{row['p50_ms']:>7.1f}ms"
+              f"{row['p95_ms']:>7.1f}ms{row['p99_ms']:>7.1f}ms{row['error_rate'] * 100:>8.2f}%")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay concurrent dashboard sessions against the in-process app")
+    parser.add_argument("--data", required=True, help="Directory written by benchmarks.generate_dataset")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--widgets", type=int, default=6, help="Widgets per DynamicPage")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds to run")
+    parser.add_argument("--ramp-up", type=float, default=5, help="Users arrive spread over this many seconds")
+    parser.add_argument("--think", type=float, default=2.0, help="Mean seconds between user actions")
+    parser.add_argument("--refresh", type=float, default=10.0, help="Seconds between live refreshes of a page")
+    parser.add_argument("--time-change-rate", type=float, default=0.3, help="Share of actions that change globalTime")
+    parser.add_argument("--datasource-rate", type=float, default=0.1, help="Share of actions that visit the data source page")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Client timeout per request")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="Also write the report as JSON")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    for noisy in ("services", "httpx", "main"):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+    args = parse_args()
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Report written to {args.out}")
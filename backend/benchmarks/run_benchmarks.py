@@ -0,0 +1,244 @@
+# benchmarks/run_benchmarks.py
+"""Latency and throughput benchmarks of query_parquet_data and /query.
+
+Ranges (1h, 1d, 1 month, 1 year) end at the last day of the generated
+dataset; ranges longer than the dataset are skipped. Each range runs in
+these modes:
+
+    service/cold    new DuckDB engine and parquet catalog per run, no result cache
+    service/warm    shared engine and catalog, no result cache
+    service/cached  shared engine and catalog with the result cache
+    http/warm       POST /query in-process, range shifted back an hour per run so the result cache misses
+    http/cached     POST /query repeating the same request
+
+Rollups are built for the dataset before timing, as they would exist in
+production. Results are written as JSON; --compare prints the change
+against an earlier file and exits non-zero when a p50 regresses by more
+than --tolerance percent.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from benchmarks.generate_dataset import load_manifest
+
+logger = logging.getLogger(__name__)
+
+RANGES = {"1h": timedelta(hours=1), "1d": timedelta(days=1), "1mo": timedelta(days=30), "1y": timedelta(days=365)}
+
+def _configure_environment(data_dir: str, manifest: Dict[str, Any]):
+    """Point config at the synthetic tree; must run before anything imports config"""
+    os.environ["BASE_PARQUET_PATH"] = manifest["base_path"]
+    os.environ["ROLLUP_PARQUET_PATH"] = os.path.join(os.path.abspath(data_dir), "rollups", f"site={manifest['site']}")
+    os.environ["DUCKDB_TEMP_DIRECTORY"] = os.path.join(os.path.abspath(data_dir), "duckdb_spill")
+    os.environ["SQLITE_URL"] = "sqlite:///" + os.path.join(os.path.abspath(data_dir), "bench_meta.sqlite3")
+
+def _summary(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        "runs": len(ordered),
+        "min_ms": round(ordered[0] * 1000, 2),
+        "p50_ms": round(statistics.median(ordered) * 1000, 2),
+        "p95_ms": round(p95 * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2)
+    }
+
+def _time(fn: Callable[[int], Any], repeat: int) -> List[float]:
+    samples = []
+    for run in range(repeat):
+        started = time.perf_counter()
+        fn(run)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def _request(manifest: Dict[str, Any], span: timedelta, shift_hours: int = 0) -> Dict[str, Any]:
+    """A typical chart request: two metrics of one bank, automatic window.
+
+    shift_hours moves the range back in whole hours, which keeps it aligned
+    to the rollup buckets like the unshifted request.
+    """
+    end = (datetime.fromisoformat(manifest["start"]) + timedelta(days=manifest["days"])
+           - timedelta(hours=shift_hours, seconds=1))
+    return {
+        "year": None, "month": None, "day": None, "dcu": 1,
+        "equipment": manifest["equipment"][0],
+        "start_time": (end - span + timedelta(seconds=1)).isoformat(),
+        "end_time": end.isoformat(),
+        "metrics": ["n_soc", "n_voltage"],
+        "window_period": None,
+        "where_args": None,
+        "conditions": [{"column": "n_bank", "op": "=", "value": 1}]
+    }
+
+def run(args) -> Dict[str, Any]:
+    manifest = load_manifest(args.data)
+    _configure_environment(args.data, manifest)
+
+    import config
+    from fastapi.testclient import TestClient
+    from models.filters import QueryFilters
+    from services.duckdb_engine import DuckDBEngine
+    from services.duckdb_service import query_parquet_data
+    from services.parquet_catalog import ParquetCatalog
+    from services.query_cache import QueryResultCache
+    from services.resource_governor import configured_settings
+    from services.rollup_service import build_rollups
+
+    def new_catalog():
+        return ParquetCatalog(base_path=config.BASE_PARQUET_PATH, refresh_interval=config.CATALOG_REFRESH_SECONDS,
+                              stat_columns=config.CATALOG_STAT_COLUMNS)
+
+    settings = configured_settings()
+    engine = DuckDBEngine(pool_size=config.DUCKDB_POOL_SIZE, settings=settings)
+    catalog = new_catalog()
+    build_rollups(config.ROLLUP_PARQUET_PATH, config.ROLLUP_RESOLUTIONS, config.ROLLUP_TAG_COLUMNS,
+                  catalog=catalog, engine=engine)
+    cache = QueryResultCache(max_bytes=config.QUERY_CACHE_MAX_BYTES)
+
+    span_days = manifest["days"]
+    results, skipped = [], []
+
+    def record(name: str, range_name: str, samples: List[float]):
+        entry = {"name": f"{name}/{range_name}", "range": range_name, **_summary(samples)}
+        results.append(entry)
+        logger.info(f"{entry['name']:<24} p50 {entry['p50_ms']:>9.2f} ms  p95 {entry['p95_ms']:>9.2f} ms")
+
+    for range_name, span in RANGES.items():
+        if span > timedelta(days=span_days):
+            skipped.append(range_name)
+            continue
+        filters = QueryFilters(**_request(manifest, span))
+
+        def cold(_):
+            cold_engine = DuckDBEngine(pool_size=1, settings=settings)
+            try:
+                query_parquet_data(filters, engine=cold_engine, catalog=new_catalog(), cache=None)
+            finally:
+                cold_engine.close()
+        record("service/cold", range_name, _time(cold, args.repeat))
+
+        query_parquet_data(filters, engine=engine, catalog=catalog, cache=None)
+        record("service/warm", range_name,
+               _time(lambda _: query_parquet_data(filters, engine=engine, catalog=catalog, cache=None), args.repeat))
+
+        query_parquet_data(filters, engine=engine, catalog=catalog, cache=cache)
+        record("service/cached", range_name,
+               _time(lambda _: query_parquet_data(filters, engine=engine, catalog=catalog, cache=cache), args.repeat))
+
+    import main
+    with TestClient(main.app) as client:
+        for range_name, span in RANGES.items():
+            if range_name in skipped:
+                continue
+
+            def post(body):
+                response = client.post("/query", json=body)
+                if response.status_code != 200:
+                    raise RuntimeError(f"/query returned {response.status_code}: {response.text[:200]}")
+
+            post(_request(manifest, span))
+            record("http/warm", range_name, _time(lambda run: post(_request(manifest, span, run + 1)), args.repeat))
+            body = _request(manifest, span)
+            record("http/cached", range_name, _time(lambda _: post(body), args.repeat))
+
+    # Throughput: concurrent uncached queries on the shared engine
+    throughput = []
+    for range_name in ("1d", "1mo"):
+        if range_name in skipped:
+            continue
+        requests = [QueryFilters(**_request(manifest, RANGES[range_name], i)) for i in range(args.throughput_queries)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(lambda f: query_parquet_data(f, engine=engine, catalog=catalog, cache=None), requests))
+        elapsed = time.perf_counter() - started
+        throughput.append({"name": f"service/throughput/{range_name}", "range": range_name,
+                           "concurrency": args.concurrency, "queries": len(requests),
+                           "queries_per_second": round(len(requests) / elapsed, 2)})
+        logger.info(f"service/throughput/{range_name}: {throughput[-1]['queries_per_second']} queries/s")
+
+    engine.close()
+    import duckdb
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "duckdb": duckdb.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "duckdb_settings": settings,
+            "repeat": args.repeat,
+            "dataset": {k: manifest[k] for k in ("days", "equipment", "dcus", "banks", "racks",
+                                                 "interval_seconds", "files", "rows", "bytes")}
+        },
+        "skipped_ranges": skipped,
+        "results": results,
+        "throughput": throughput
+    }
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Print p50 and throughput changes; return the names that regressed beyond tolerance"""
+    regressions = []
+    before = {r["name"]: r for r in baseline.get("results", [])}
+    print(f"{'benchmark':<26}{'baseline p50':>14}{'current p50':>14}{'change':>10}")
+    for result in current["results"]:
+        old = before.get(result["name"])
+        if not old:
+            continue
+        change = (result["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100 if old["p50_ms"] else 0.0
+        flag = "  REGRESSION" if change > tolerance else ""
+        if flag:
+            regressions.append(result["name"])
+        print(f"{result['name']:<26}{old['p50_ms']:>12.2f}ms{result['p50_ms']:>12.2f}ms{change:>9.1f}%{flag}")
+
+    old_throughput = {t["name"]: t for t in baseline.get("throughput", [])}
+    for result in current.get("throughput", []):
+        old = old_throughput.get(result["name"])
+        if not old:
+            continue
+        change = (result["queries_per_second"] - old["queries_per_second"]) / old["queries_per_second"] * 100
+        flag = "  REGRESSION" if -change > tolerance else ""
+        if flag:
+            regressions.append(result["name"])
+        print(f"{result['name']:<26}{old['queries_per_second']:>10.2f} q/s{result['queries_per_second']:>10.2f} q/s"
+              f"{change:>9.1f}%{flag}")
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark query_parquet_data and /query on a generated dataset")
+    parser.add_argument("--data", required=True, help="Directory written by benchmarks.generate_dataset")
+    parser.add_argument("--out", help="Write results to this JSON file (e.g. a new baseline)")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=20.0, help="Allowed p50 regression in percent")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark")
+    parser.add_argument("--concurrency", type=int, default=4, help="Threads for the throughput benchmark")
+    parser.add_argument("--throughput-queries", type=int, default=32)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    for noisy in ("services", "httpx", "main"):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+    args = parse_args()
+    report = run(args)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Results written to {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            logger.error(f"Regressed beyond {args.tolerance:g}%: {', '.join(regressions)}")
+            sys.exit(1)
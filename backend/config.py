@@ -1,13 +1,85 @@
 # backend/config.py - UPDATED
+import os
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
 
 # Import base classes
 from models.meta_models import Base
 
-BASE_PARQUET_PATH = "D:\Asset Monitoring System\Data-Backup\site=UK_Tollgate"
+# Paths default to the production share; each can be overridden through an
+# environment variable of the same name (e.g. to point benchmarks at a synthetic tree)
+BASE_PARQUET_PATH = os.environ.get("BASE_PARQUET_PATH", r"D:\Asset Monitoring System\Data-Backup\site=UK_Tollgate")
 
-SQLITE_URL = "sqlite:///D:/Asset Monitoring System/GITHUB/Asset_monitoring/MetaDB.sqlite3"
+# DuckDB engine shared by /query and parquet discovery
+DUCKDB_POOL_SIZE = 8
+
+# DuckDB resource governor, per uvicorn worker process. None sizes from the host:
+# cores and DUCKDB_MEMORY_FRACTION of RAM split across UVICORN_WORKERS processes
+UVICORN_WORKERS = int(os.environ.get("WEB_CONCURRENCY", "1"))
+DUCKDB_THREADS = None
+DUCKDB_MEMORY_LIMIT = None  # e.g. "4GB"
+DUCKDB_MEMORY_FRACTION = 0.75
+# Large sorts/aggregations spill here instead of failing at memory_limit
+DUCKDB_TEMP_DIRECTORY = os.environ.get("DUCKDB_TEMP_DIRECTORY", r"D:\Asset Monitoring System\duckdb_spill")
+DUCKDB_MAX_TEMP_DIRECTORY_SIZE = "50GB"
+
+# /query execution: at most QUERY_MAX_CONCURRENCY queries run at once (keep it
+# at or below DUCKDB_POOL_SIZE); longer than QUERY_TIMEOUT_SECONDS are interrupted
+QUERY_MAX_CONCURRENCY = 4
+QUERY_TIMEOUT_SECONDS = 60
+
+# Background work (schema sync, auto-mapping, connection sweeps, exports) has its
+# own queue: BACKGROUND_MAX_CONCURRENCY jobs at once, each held back while chart
+# queries are busy, for at most BACKGROUND_MAX_DEFER_SECONDS
+BACKGROUND_MAX_CONCURRENCY = 1
+BACKGROUND_MAX_DEFER_SECONDS = 30
+
+# Parquet file catalog: how often a partition is re-listed, how often the whole
+# tree is walked for new or removed partitions, and which tag columns get
+# min/max statistics for file pruning
+CATALOG_REFRESH_SECONDS = 30
+CATALOG_DISCOVERY_SECONDS = 60
+CATALOG_STAT_COLUMNS = ["n_bank", "n_rack"]
+
+# Rollups: pre-aggregated copies of the raw tree at fixed resolutions (name -> seconds),
+# grouped by the tag columns so tag filters still apply
+ROLLUP_PARQUET_PATH = os.environ.get("ROLLUP_PARQUET_PATH", r"D:\Asset Monitoring System\Data-Backup\rollups\site=UK_Tollgate")
+ROLLUP_RESOLUTIONS = {"1min": 60, "15min": 900, "1h": 3600, "1d": 86400}
+ROLLUP_TAG_COLUMNS = ["n_bank", "n_rack"]
+# Rollups of finished days that are missing or stale get built on first query;
+# at most this many leaves per query, the rest are scanned raw until next time
+ROLLUP_LAZY_BUILD = True
+ROLLUP_LAZY_BUILD_MAX_LEAVES = 64
+
+# Compaction of finished days: each leaf's files are merged, de-duplicated and
+# rewritten sorted on COMPACTION_SORT_COLUMNS so footer statistics prune well. Rows
+# are duplicates when every column matches, or only COMPACTION_KEY_COLUMNS if set
+# (newest file wins; each leaf must have all of them). Row groups are sized to
+# about one bank/rack series within these bounds; replaced files are deleted once
+# the grace period has outlived any query still reading them
+COMPACTION_SORT_COLUMNS = ["n_bank", "n_rack", "t_sampling_time"]
+COMPACTION_KEY_COLUMNS = None
+COMPACTION_MIN_ROW_GROUP_ROWS = 8_192
+COMPACTION_MAX_ROW_GROUP_ROWS = 122_880
+COMPACTION_TARGET_FILE_BYTES = 256 * 1024 * 1024
+COMPACTION_MIN_AGE_SECONDS = 3600
+COMPACTION_GRACE_SECONDS = 600
+
+# Automatic bucketing: points per chart when the client sends neither max_points
+# nor width_px, and the footer-estimated row count a single query may scan
+QUERY_DEFAULT_MAX_POINTS = 100
+QUERY_SCAN_BUDGET_ROWS = 20_000_000
+
+# Result cache in front of /query (approximate in-memory size of cached frames)
+QUERY_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Slow-query log (slow_queries table): executions above the threshold are stored
+# with their fingerprint; SLOW_QUERY_EXPLAIN re-runs them under EXPLAIN ANALYZE
+SLOW_QUERY_THRESHOLD_MS = 1000
+SLOW_QUERY_EXPLAIN = False
+SLOW_QUERY_MAX_FILES_LOGGED = 50
+
+SQLITE_URL = os.environ.get("SQLITE_URL", "sqlite:///D:/Asset Monitoring System/GITHUB/Asset_monitoring/MetaDB.sqlite3")
 
 engine = create_engine(SQLITE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(bind=engine)
@@ -15,6 +87,7 @@ SessionLocal = sessionmaker(bind=engine)
 # Import all models to ensure they're registered with Base
 from models.meta_models import *
 from models.datasource_models import *
+from models.query_log_models import *
 
 # Create all tables
 Base.metadata.create_all(bind=engine)
@@ -2,22 +2,63 @@
 
 from fastapi import FastAPI, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from models.filters import QueryFilters
-from services.duckdb_service import query_parquet_data
-from fastapi.responses import JSONResponse
+from models.filters import QueryFilters, FleetQuery
+from services.duckdb_service import query_parquet_data, query_parquet_arrow, query_parquet_batch, open_record_batch_reader, query_fleet
+from services.query_executor import init_executor, get_executor, shutdown_executor, QueryTimeoutError
+from services.duckdb_engine import QueryCancelledError
+from services.encoding import columnar_payload, dumps, wants_arrow, arrow_ipc_chunks, ARROW_STREAM_MEDIA_TYPE
+from services.duckdb_engine import init_engine, get_engine, shutdown_engine
+from services.parquet_catalog import init_catalog, get_catalog
+from services.query_cache import get_query_cache, canonical_filters
+from services.single_flight import get_single_flight
+from services.resource_governor import configured_settings
+from services.metrics import IN_FLIGHT, REQUESTS, REQUEST_SECONDS, RESPONSE_BYTES, RequestTimings, current_timings, phase, render
+from config import DUCKDB_POOL_SIZE, BASE_PARQUET_PATH, CATALOG_REFRESH_SECONDS, CATALOG_DISCOVERY_SECONDS, CATALOG_STAT_COLUMNS
+from config import QUERY_MAX_CONCURRENCY, QUERY_TIMEOUT_SECONDS, BACKGROUND_MAX_CONCURRENCY, BACKGROUND_MAX_DEFER_SECONDS
+import json
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+import pyarrow as pa
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from services.meta_routes import router as meta_router
 from services.page_routes import router as page_router
 from services.datasource_routes import router as datasource_router  # New router
+from services.admin_routes import router as admin_router
 from pydantic import BaseModel
 from typing import List
 
 from typing import Optional
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One DuckDB engine for the whole process, shared by every request
+    init_engine(pool_size=DUCKDB_POOL_SIZE, settings=configured_settings())
+    init_executor(max_concurrency=QUERY_MAX_CONCURRENCY, timeout=QUERY_TIMEOUT_SECONDS,
+                  background_concurrency=BACKGROUND_MAX_CONCURRENCY,
+                  background_max_defer=BACKGROUND_MAX_DEFER_SECONDS)
+    catalog = init_catalog(
+        base_path=BASE_PARQUET_PATH,
+        refresh_interval=CATALOG_REFRESH_SECONDS,
+        stat_columns=CATALOG_STAT_COLUMNS
+    )
+    # Index the whole tree in the background and re-walk it for new partitions;
+    # queries look leaves up in the index and re-list their own leaves lazily
+    catalog_stop = threading.Event()
+    threading.Thread(target=catalog.refresh_every, args=(CATALOG_DISCOVERY_SECONDS, catalog_stop),
+                     name="catalog-refresh", daemon=True).start()
+    yield
+    catalog_stop.set()
+    shutdown_executor()
+    shutdown_engine()
+
+app = FastAPI(lifespan=lifespan)
 
 # Include all routers
 app.include_router(meta_router)
 app.include_router(page_router)
 app.include_router(datasource_router)  # Add new data source router
+app.include_router(admin_router)
 
 # Allow frontend requests (CORS)
 app.add_middleware(
@@ -28,6 +69,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """Per-phase Server-Timing header plus request metrics for /metrics"""
+    timings = RequestTimings()
+    reset = current_timings.set(timings)
+    IN_FLIGHT.inc()
+    started = time.perf_counter()
+    response = None
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["Server-Timing"] = timings.server_timing(time.perf_counter() - started)
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        IN_FLIGHT.dec()
+        current_timings.reset(reset)
+        # Label by route template, not the raw path, to keep the series count bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        REQUESTS.inc(route=route, method=request.method, status=status)
+        REQUEST_SECONDS.observe(elapsed, route=route, method=request.method)
+        if response is not None and "content-length" in response.headers:
+            RESPONSE_BYTES.observe(int(response.headers["content-length"]), route=route)
+
 class WidgetLayout(BaseModel):
     id: str
     x: int
@@ -50,22 +116,139 @@ async def save_layout(layout_data: LayoutRequest, page_id: int = Query(...)):
 async def root():
     return {"message": "Equipment Monitoring System Backend Running"}
 
+def _to_records(df):
+    """Shape a query result the way the frontend expects"""
+    # Rename timestamp column to 't_sampling_time' for frontend consistency
+    if 'bucket_time' in df.columns:
+        df.rename(columns={"bucket_time": "t_sampling_time"}, inplace=True)
+
+    # Convert timestamps to ISO strings
+    if "t_sampling_time" in df.columns:
+        df["t_sampling_time"] = df["t_sampling_time"].astype(str)
+
+    return df.to_dict(orient="records")
+
+def _arrow_stream_response(reader, float32: bool):
+    """Stream record batches of an in-memory result to the client"""
+    return StreamingResponse(arrow_ipc_chunks(reader, float32=float32), media_type=ARROW_STREAM_MEDIA_TYPE)
+
+@contextmanager
+def _arrow_query_chunks(filters, float32: bool):
+    """Arrow IPC chunks of a query, scanned batch by batch on the borrowed cursor"""
+    with open_record_batch_reader(filters, engine=get_engine(), catalog=get_catalog()) as reader:
+        yield arrow_ipc_chunks(reader, float32=float32)
+
+def _query_error(e: Exception) -> JSONResponse:
+    if isinstance(e, QueryTimeoutError):
+        return JSONResponse(status_code=504, content={"error": str(e)})
+    if isinstance(e, QueryCancelledError):
+        # Client Closed Request: nobody is listening, but keep the log readable
+        return JSONResponse(status_code=499, content={"error": str(e)})
+    return JSONResponse(status_code=500, content={"error": str(e)})
+
+def _records_content(filters):
+    df = query_parquet_data(filters, engine=get_engine(), catalog=get_catalog(), cache=get_query_cache())
+    with phase("postprocess"):
+        return _to_records(df)
+
+def _columnar_content(filters) -> bytes:
+    table = query_parquet_arrow(filters, engine=get_engine(), catalog=get_catalog(), cache=get_query_cache())
+    with phase("serialize"):
+        return dumps(columnar_payload(table, group_by=filters.group_by or ()))
+
+def _json_response(content) -> JSONResponse:
+    with phase("serialize"):
+        return JSONResponse(content=content)
+
 @app.post("/query")
-async def query_data(filters: Optional[QueryFilters]):
+async def query_data(request: Request, filters: Optional[QueryFilters],
+                     format: str = Query("records", description="'records' (one object per row) or 'columnar'"),
+                     float32: bool = Query(False, description="Downcast float columns in Arrow responses")):
+    # DuckDB work runs on the bounded query executor, never on the event loop
+    executor = get_executor()
+    try:
+        # Content negotiation: Accept: application/vnd.apache.arrow.stream
+        if wants_arrow(request.headers.get("accept")):
+            # The scan runs on the executor for the whole stream, within its slot and timeout
+            chunks = await executor.stream(_arrow_query_chunks, filters, float32, request=request)
+            return StreamingResponse(chunks, media_type=ARROW_STREAM_MEDIA_TYPE)
+
+        # Identical queries already in flight (e.g. every dashboard reloading at
+        # shift change) share one execution instead of each scanning again
+        if format == "columnar":
+            content = await get_single_flight().do_async(
+                canonical_filters(filters, format="columnar"),
+                lambda: executor.run(_columnar_content, filters),
+                request=request
+            )
+            return Response(content=content, media_type="application/json")
+
+        content = await get_single_flight().do_async(
+            canonical_filters(filters, format="records"),
+            lambda: executor.run(_records_content, filters),
+            request=request
+        )
+        return _json_response(content)
+    except Exception as e:
+        return _query_error(e)
+
+def _batch_frames(filters_list):
+    return query_parquet_batch(filters_list, engine=get_engine(), catalog=get_catalog(), cache=get_query_cache())
+
+def _batch_table(filters_list) -> pa.Table:
+    # One stream for all widgets; query_index tells the rows apart
+    tables = [
+        pa.Table.from_pandas(df, preserve_index=False).append_column(
+            "query_index", pa.array([index] * len(df), pa.int32()))
+        for index, df in enumerate(_batch_frames(filters_list))
+    ]
+    return pa.concat_tables(tables, promote_options="default")
+
+def _batch_records(filters_list):
+    frames = _batch_frames(filters_list)
+    with phase("postprocess"):
+        return [_to_records(df) for df in frames]
+
+@app.post("/query/batch")
+async def query_batch(request: Request, filters_list: List[QueryFilters],
+                      float32: bool = Query(False, description="Downcast float columns in Arrow responses")):
+    """Run every widget query of a page at once; widgets on the same equipment,
+    dcu and time range share a single parquet scan"""
     try:
-        df = query_parquet_data(filters)
+        arrow = wants_arrow(request.headers.get("accept"))
+        key = json.dumps([canonical_filters(f) for f in filters_list] + [{"arrow": arrow}])
+        content = await get_single_flight().do_async(
+            key,
+            lambda: get_executor().run(_batch_table if arrow else _batch_records, filters_list),
+            request=request
+        )
 
-        # Rename timestamp column to 't_sampling_time' for frontend consistency
-        if 'bucket_time' in df.columns:
-            df.rename(columns={"bucket_time": "t_sampling_time"}, inplace=True)
+        if arrow:
+            return _arrow_stream_response(content.to_reader(), float32)
+        return _json_response(content)
+    except Exception as e:
+        return _query_error(e)
 
-        # Convert timestamps to ISO strings
-        if "t_sampling_time" in df.columns:
-            df["t_sampling_time"] = df["t_sampling_time"].astype(str)
+def _fleet_content(fleet):
+    return query_fleet(fleet, engine=get_engine(), catalog=get_catalog(), cache=get_query_cache())
 
-        return JSONResponse(content=df.to_dict(orient="records"))
+@app.post("/query/fleet")
+async def query_fleet_ranking(request: Request, fleet: FleetQuery):
+    """Per-DCU aggregates of one metric across the fleet plus a top/bottom-N ranking"""
+    try:
+        content = await get_single_flight().do_async(
+            json.dumps(["fleet", fleet.model_dump()], sort_keys=True, default=str),
+            lambda: get_executor().run(_fleet_content, fleet),
+            request=request
+        )
+        return _json_response(content)
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return _query_error(e)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
 
 # Health check endpoint for data sources
 @app.get("/health")
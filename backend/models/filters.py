@@ -1,7 +1,30 @@
 # models/filters.py
 
-from typing import Optional, List
-from pydantic import BaseModel
+from typing import Optional, List, Literal, Union
+from typing_extensions import Annotated
+from pydantic import BaseModel, Field, model_validator
+
+FilterValue = Union[int, float, str]
+Identifier = Annotated[str, Field(pattern=r"^[A-Za-z_][A-Za-z0-9_]*$")]
+
+class FilterCondition(BaseModel):
+    """One typed predicate on a data column, e.g. n_bank IN (1, 2)"""
+    column: Identifier
+    op: Literal["=", "!=", "<", "<=", ">", ">=", "in", "not_in", "between"] = "="
+    value: Optional[FilterValue] = None          # comparison operators
+    values: Optional[List[FilterValue]] = None   # in / not_in, or [low, high] for between
+
+    @model_validator(mode="after")
+    def check_operands(self):
+        if self.op in ("in", "not_in"):
+            if not self.values:
+                raise ValueError(f"'{self.op}' needs a non-empty values list")
+        elif self.op == "between":
+            if not self.values or len(self.values) != 2:
+                raise ValueError("'between' needs values [low, high]")
+        elif self.value is None:
+            raise ValueError(f"'{self.op}' needs a value")
+        return self
 
 class QueryFilters(BaseModel):
     year: Optional[int]
@@ -13,4 +36,23 @@ class QueryFilters(BaseModel):
     end_time: Optional[str]    # Example: '2025-02-02T23:59:59Z'
     metrics: Optional[List[str]]
     window_period: Optional[str]  # Example: '1 hour', '30 minutes', etc.
-    where_args:Optional[List[str]]
\ No newline at end of file
+    where_args:Optional[List[str]]
+    conditions: Optional[List[FilterCondition]] = None  # Typed filters, AND-ed with where_args
+    equipment_id: Optional[int] = None  # Also apply this equipment's EquipmentFilter rows
+    group_by: Optional[List[Identifier]] = None  # Tag columns, e.g. ['n_bank']: one series per tag value
+    max_points: Optional[int] = None  # Points wanted when window_period is empty
+    width_px: Optional[int] = None    # Chart width; caps the point count at one per pixel
+    aggregation: Optional[Literal["avg", "m4", "lttb"]] = None  # How buckets are reduced; default avg
+    since: Optional[str] = None  # Tail refresh: last bucket the client already has; only buckets from it onward are returned
+
+class FleetQuery(BaseModel):
+    """Per-DCU aggregate of one metric across every equipment/dcu partition, plus a ranking"""
+    start_time: str
+    end_time: str
+    metric: Identifier
+    equipment: Optional[str] = None  # Limit to one equipment type; None scans all
+    aggregate: Literal["avg", "min", "max", "last"] = "avg"  # Value the DCUs are ranked by
+    top_n: int = Field(10, ge=1)
+    order: Literal["asc", "desc"] = "asc"  # asc: lowest values first (bottom-N)
+    where_args: Optional[List[str]] = None
+    conditions: Optional[List[FilterCondition]] = None
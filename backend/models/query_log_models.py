@@ -0,0 +1,23 @@
+# backend/models/query_log_models.py
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float
+from models.meta_models import Base  # Use the same Base as meta_models
+import uuid
+from datetime import datetime
+
+class SlowQuery(Base):
+    __tablename__ = 'slow_queries'
+
+    query_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    fingerprint = Column(String(16), nullable=False, index=True)  # hash of fingerprint_data
+    fingerprint_data = Column(Text, nullable=False)  # JSON: metrics, equipment, dcu, window, range, filter shape
+    equipment = Column(String(64))
+    dcu = Column(Integer)
+    duration_ms = Column(Float, nullable=False)
+    phases = Column(Text)  # JSON: {"resolve": ms, "scan": ms, ...}
+    files_touched = Column(Integer)
+    files = Column(Text)  # JSON list, truncated to SLOW_QUERY_MAX_FILES_LOGGED
+    rows_scanned = Column(Integer)  # footer estimate of the rows the scan covers
+    result_rows = Column(Integer)
+    explain_analyze = Column(Text)  # DuckDB profile, when SLOW_QUERY_EXPLAIN is on
+    status = Column(String(16), default="ok")  # ok, timeout, cancelled or error
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
@@ -0,0 +1,109 @@
+# backend/services/admin_routes.py
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
+from typing import Optional
+import json
+import logging
+
+from config import QUERY_SCAN_BUDGET_ROWS, UVICORN_WORKERS, SLOW_QUERY_THRESHOLD_MS, get_db
+import services.query_log_crud as query_log_crud
+from services.duckdb_engine import get_engine
+from services.query_executor import get_executor
+from services.resource_governor import host_resources
+
+logger = logging.getLogger(__name__)
+
+admin_router = APIRouter(prefix="/admin", tags=["Admin"])
+
+# ---------- Pydantic Schemas ----------
+class ResourceSettingsUpdate(BaseModel):
+    """Fields left out keep their current value"""
+    threads: Optional[int] = Field(None, ge=1)
+    memory_limit: Optional[str] = None
+    temp_directory: Optional[str] = None
+    max_temp_directory_size: Optional[str] = None
+    query_timeout_seconds: Optional[float] = Field(None, gt=0)
+
+def _resources():
+    executor = get_executor()
+    return {
+        "duckdb": get_engine().settings(),
+        "query": {
+            "max_concurrency": executor.max_concurrency,
+            "timeout_seconds": executor.timeout,
+            "scan_budget_rows": QUERY_SCAN_BUDGET_ROWS,
+            "classes": executor.stats()
+        },
+        "host": {**host_resources(), "workers": UVICORN_WORKERS}
+    }
+
+# ---------- Resource governor ----------
+@admin_router.get("/resources")
+def get_resources():
+    """DuckDB resource settings and per-query limits of this worker"""
+    return _resources()
+
+@admin_router.put("/resources")
+def update_resources(update: ResourceSettingsUpdate):
+    """Change DuckDB threads/memory/spill settings and the query timeout at runtime"""
+    changes = update.model_dump(exclude_none=True)
+    timeout = changes.pop("query_timeout_seconds", None)
+    try:
+        if changes:
+            get_engine().apply_settings(changes)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if timeout is not None:
+        get_executor().timeout = timeout
+        logger.info(f"Query timeout set to {timeout:g}s")
+    return _resources()
+
+# ---------- Slow-query log ----------
+def _slow_query_out(record):
+    return {
+        "query_id": record.query_id,
+        "fingerprint": record.fingerprint,
+        "pattern": json.loads(record.fingerprint_data),
+        "duration_ms": record.duration_ms,
+        "phases": json.loads(record.phases or "{}"),
+        "files_touched": record.files_touched,
+        "files": json.loads(record.files or "[]"),
+        "rows_scanned": record.rows_scanned,
+        "result_rows": record.result_rows,
+        "explain_analyze": record.explain_analyze,
+        "status": record.status or "ok",
+        "created_at": record.created_at.isoformat() if record.created_at else None
+    }
+
+@admin_router.get("/slow-queries/top")
+def get_top_slow_queries(limit: int = Query(10, ge=1, le=500),
+                         order_by: str = Query("total_ms", description="total_ms, count, avg_ms or max_ms"),
+                         since_hours: Optional[int] = Query(None, ge=1, description="Only look at the last N hours"),
+                         db: Session = Depends(get_db)):
+    """Slow query patterns grouped by fingerprint; the best candidates for pre-aggregation"""
+    if order_by not in query_log_crud.TOP_ORDERINGS:
+        raise HTTPException(status_code=400, detail=f"order_by must be one of {', '.join(query_log_crud.TOP_ORDERINGS)}")
+    return {
+        "threshold_ms": SLOW_QUERY_THRESHOLD_MS,
+        "patterns": query_log_crud.get_top_fingerprints(db, limit, order_by, since_hours)
+    }
+
+@admin_router.get("/slow-queries")
+def get_slow_queries(limit: int = Query(50, ge=1, le=1000),
+                     fingerprint: Optional[str] = Query(None, description="Only executions of this pattern"),
+                     db: Session = Depends(get_db)):
+    """Most recent slow query executions"""
+    if fingerprint:
+        records = query_log_crud.get_slow_queries_by_fingerprint(db, fingerprint, limit)
+    else:
+        records = query_log_crud.get_recent_slow_queries(db, limit)
+    return [_slow_query_out(r) for r in records]
+
+@admin_router.delete("/slow-queries")
+def clear_slow_queries(older_than_days: Optional[int] = Query(None, ge=0, description="Keep newer records"),
+                       db: Session = Depends(get_db)):
+    """Delete slow query records"""
+    return {"deleted": query_log_crud.delete_slow_queries(db, older_than_days)}
+
+router = admin_router
@@ -0,0 +1,234 @@
+# services/compaction_service.py
+"""Compaction of finished raw leaf partitions.
+
+Backups drop many small parquet files into each
+year/month/day/equipment/dcu leaf, often with rows repeated across them.
+Compaction rewrites such a leaf as a few large files:
+
+    - exact duplicate rows dropped; with COMPACTION_KEY_COLUMNS set, rows
+      sharing those columns are duplicates and the newest file wins
+    - sorted by COMPACTION_SORT_COLUMNS (n_bank, n_rack, t_sampling_time) so
+      each row group covers one bank/rack series and min/max statistics
+      prune well
+    - ZSTD compressed, row groups sized to about one series per group
+
+The swap is safe while queries run. New files are written as
+compacted-<stamp>-<n>.parquet and stay invisible to the catalog until the
+leaf's _compaction.json marker publishes them; replacing the marker (an
+atomic rename) hides the old files at the same moment. The old files stay on
+disk for COMPACTION_GRACE_SECONDS so queries that listed them before the swap
+can finish, and a later run deletes them.
+
+Run `python -m services.compaction_service` from the backend directory (e.g.
+from the same scheduled task as the rollup build, before it). Only leaves of
+past days whose newest file is older than COMPACTION_MIN_AGE_SECONDS and that
+hold files not written by compaction are rewritten.
+"""
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pyarrow.parquet as pq
+
+from services.duckdb_engine import DuckDBEngine, get_engine
+from services.parquet_catalog import (COMPACTED_PREFIX, COMPACTION_MARKER, ParquetCatalog, get_catalog,
+                                      parse_partition, read_compaction_marker)
+
+logger = logging.getLogger(__name__)
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+def _ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def _write_marker(leaf_dir: str, published: List[str], superseded: List[str]):
+    """Replace the leaf's marker in one rename so readers never see a half-written one"""
+    tmp_file = os.path.join(leaf_dir, COMPACTION_MARKER + ".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump({"published": sorted(published), "superseded": sorted(superseded),
+                   "updated_at": datetime.now().isoformat(timespec="seconds")}, f, indent=2)
+    os.replace(tmp_file, os.path.join(leaf_dir, COMPACTION_MARKER))
+
+def needs_compaction(leaf_dir: str, catalog: ParquetCatalog, min_age: float, force: bool = False) -> bool:
+    """Past day, settled for min_age seconds, and holding files compaction didn't write"""
+    files = catalog.leaf_files(leaf_dir)
+    if not files:
+        return False
+    part = parse_partition(leaf_dir, catalog.base_path)
+    try:
+        day_start = datetime(int(part["year"]), int(part["month"]), int(part["day"]))
+    except (KeyError, ValueError):
+        return False
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    if day_start >= today or time.time() - max(f.mtime for f in files) < min_age:
+        return False
+    return force or any(not os.path.basename(f.path).startswith(COMPACTED_PREFIX) for f in files)
+
+def _row_group_rows(con, files_sql: str, series_columns: List[str], total_rows: int,
+                    min_rows: int, max_rows: int) -> int:
+    """Rows per row group: about one bank/rack series, within [min_rows, max_rows]"""
+    if not series_columns:
+        return max_rows
+    columns = ", ".join(series_columns)
+    series = con.execute(
+        f"SELECT COUNT(*) FROM (SELECT DISTINCT {columns} FROM read_parquet({files_sql}, union_by_name = true))"
+    ).fetchone()[0]
+    return max(min_rows, min(max_rows, total_rows // max(series, 1)))
+
+def compact_leaf(engine: DuckDBEngine, catalog: ParquetCatalog, leaf_dir: str, sort_columns: List[str],
+                 min_row_group_rows: int, max_row_group_rows: int, target_file_bytes: int,
+                 key_columns: Optional[List[str]] = None) -> Dict[str, int]:
+    """Rewrite one leaf as sorted, de-duplicated files and publish them; returns row counts.
+
+    Rows are duplicates when all their columns match, or only key_columns
+    when given; sort_columns only decide the order.
+    """
+    # Oldest first, so a higher position in the list means a newer copy of a row
+    raw_files = sorted(catalog.leaf_files(leaf_dir), key=lambda f: (f.mtime, f.path))
+    paths = [f.path for f in raw_files]
+    rows_before = sum(f.row_count for f in raw_files)
+    files_sql = "[" + ", ".join(_quote(p) for p in paths) + "]"
+    # Unique per run: a name reused within the same second would overwrite the live files
+    stamp = f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    tmp_dir = os.path.join(leaf_dir, f"_compacting-{stamp}")
+
+    try:
+        with engine.cursor() as con:
+            names = [row[0] for row in con.execute(
+                f"DESCRIBE SELECT * FROM read_parquet({files_sql}, union_by_name = true, hive_partitioning = false)"
+            ).fetchall()]
+            if catalog.time_column not in names:
+                raise ValueError(f"{catalog.time_column} is missing from the files of {leaf_dir}")
+            missing = [c for c in key_columns or [] if c not in names]
+            if missing:
+                raise ValueError(f"key columns {missing} are missing from the files of {leaf_dir}")
+            order = [c for c in sort_columns if c in names]
+            row_group = _row_group_rows(con, files_sql, [c for c in order if c != catalog.time_column],
+                                        rows_before, min_row_group_rows, max_row_group_rows)
+            key_sql = ", ".join(_ident(c) for c in key_columns or names)
+            order_sql = ", ".join(_ident(c) for c in order)
+            con.execute(f"""
+                COPY (
+                    SELECT * EXCLUDE (filename)
+                    FROM read_parquet({files_sql}, union_by_name = true, hive_partitioning = false, filename = true)
+                    QUALIFY row_number() OVER (PARTITION BY {key_sql} ORDER BY list_position({files_sql}, filename) DESC) = 1
+                    ORDER BY {order_sql}
+                ) TO {_quote(tmp_dir)} (FORMAT parquet, COMPRESSION zstd, ROW_GROUP_SIZE {row_group},
+                                        FILE_SIZE_BYTES {target_file_bytes}, FILENAME_PATTERN 'part_{{i}}')
+            """)
+
+        written = sorted(os.listdir(tmp_dir))
+        rows_after = sum(pq.read_metadata(os.path.join(tmp_dir, name)).num_rows for name in written)
+        if not written or not 0 < rows_after <= rows_before:
+            raise ValueError(f"compaction of {leaf_dir} wrote {rows_after} rows from {rows_before}")
+
+        published = []
+        for i, name in enumerate(written):
+            target = f"{COMPACTED_PREFIX}{stamp}-{i}.parquet"
+            os.replace(os.path.join(tmp_dir, name), os.path.join(leaf_dir, target))
+            published.append(target)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    # Files hidden by an earlier run but not yet deleted stay hidden; the new files never are
+    marker = read_compaction_marker(leaf_dir)
+    superseded = (set(marker["superseded"]) | {os.path.basename(p) for p in paths}) - set(published)
+    _write_marker(leaf_dir, published, [n for n in superseded if os.path.exists(os.path.join(leaf_dir, n))])
+    catalog.refresh_leaf(leaf_dir, force=True)
+    return {"files_before": len(paths), "files_after": len(published),
+            "rows_before": rows_before, "rows_after": rows_after}
+
+def purge_superseded(leaf_dir: str, grace_seconds: float, catalog: Optional[ParquetCatalog] = None) -> int:
+    """Delete files the marker hid more than grace_seconds ago; returns how many went"""
+    marker_file = os.path.join(leaf_dir, COMPACTION_MARKER)
+    try:
+        hidden_at = os.path.getmtime(marker_file)
+    except OSError:
+        return 0
+    marker = read_compaction_marker(leaf_dir)
+    if not marker["superseded"] or time.time() - hidden_at < grace_seconds:
+        return 0
+
+    remaining, deleted = [], 0
+    for name in marker["superseded"]:
+        path = os.path.join(leaf_dir, name)
+        try:
+            # A backup wrote the file again after it was hidden: keep it, it is new data
+            if os.path.getmtime(path) > hidden_at:
+                continue
+            os.remove(path)
+            deleted += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # Still open somewhere (Windows); try again next run
+            logger.warning(f"Could not delete superseded {name} in {leaf_dir}: {e}")
+            remaining.append(name)
+    # Dropping a name from the marker makes a file of that name visible again, which
+    # is what a later backup copying the same file back into the leaf should get
+    _write_marker(leaf_dir, marker["published"], remaining)
+    if catalog is not None:
+        catalog.refresh_leaf(leaf_dir, force=True)
+    return deleted
+
+def compact_partitions(sort_columns: List[str], min_row_group_rows: int, max_row_group_rows: int,
+                       target_file_bytes: int, min_age: float, grace_seconds: float,
+                       catalog: Optional[ParquetCatalog] = None, engine: Optional[DuckDBEngine] = None,
+                       force: bool = False, dry_run: bool = False,
+                       key_columns: Optional[List[str]] = None) -> Dict[str, int]:
+    """Purge expired superseded files, then compact every leaf that needs it"""
+    catalog = catalog or get_catalog()
+    engine = engine or get_engine()
+    catalog.refresh()
+
+    result = {"compacted": 0, "skipped": 0, "failed": 0, "purged": 0, "duplicates_dropped": 0}
+    for leaf_dir in catalog.partitions():
+        if not dry_run:
+            result["purged"] += purge_superseded(leaf_dir, grace_seconds, catalog)
+        if not needs_compaction(leaf_dir, catalog, min_age, force):
+            result["skipped"] += 1
+            continue
+        if dry_run:
+            logger.info(f"Would compact {leaf_dir} ({len(catalog.leaf_files(leaf_dir))} files)")
+            result["compacted"] += 1
+            continue
+        try:
+            stats = compact_leaf(engine, catalog, leaf_dir, sort_columns, min_row_group_rows,
+                                 max_row_group_rows, target_file_bytes, key_columns)
+            result["compacted"] += 1
+            result["duplicates_dropped"] += stats["rows_before"] - stats["rows_after"]
+            logger.info(f"Compacted {leaf_dir}: {stats['files_before']} -> {stats['files_after']} files, "
+                        f"{stats['rows_before']} -> {stats['rows_after']} rows")
+        except Exception as e:
+            result["failed"] += 1
+            logger.error(f"Failed to compact {leaf_dir}: {e}")
+
+    logger.info(f"Compaction finished: {result}")
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import (COMPACTION_SORT_COLUMNS, COMPACTION_KEY_COLUMNS, COMPACTION_MIN_ROW_GROUP_ROWS,
+                        COMPACTION_MAX_ROW_GROUP_ROWS, COMPACTION_TARGET_FILE_BYTES, COMPACTION_MIN_AGE_SECONDS,
+                        COMPACTION_GRACE_SECONDS)
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Merge, de-duplicate and sort the parquet files of finished days")
+    parser.add_argument("--force", action="store_true", help="Also rewrite leaves that are already compacted")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the leaves that would be compacted")
+    parser.add_argument("--grace", type=float, default=COMPACTION_GRACE_SECONDS,
+                        help="Seconds replaced files are kept for running queries")
+    parser.add_argument("--min-age", type=float, default=COMPACTION_MIN_AGE_SECONDS,
+                        help="Skip leaves with a file written less than this many seconds ago")
+    args = parser.parse_args()
+
+    compact_partitions(COMPACTION_SORT_COLUMNS, COMPACTION_MIN_ROW_GROUP_ROWS, COMPACTION_MAX_ROW_GROUP_ROWS,
+                       COMPACTION_TARGET_FILE_BYTES, args.min_age, args.grace, force=args.force, dry_run=args.dry_run,
+                       key_columns=COMPACTION_KEY_COLUMNS)
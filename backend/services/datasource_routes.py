@@ -3,6 +3,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi_utils.cbv import cbv
 from sqlalchemy.orm import Session
 from config import get_db
+import hashlib
 import json
 import logging
 from typing import List, Optional
@@ -21,6 +22,9 @@ import services.datasource_crud as crud
 
 # Import discovery services
 from services.discovery_services import get_discovery_service
+from services.single_flight import get_single_flight
+from services.query_executor import get_executor
+from services.metrics import phase
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -164,6 +168,20 @@ class ConnectionRoutes:
             )
 
 # ---------- Discovery Routes ----------
+def _discovery_key(kind: str, source_type: str, connection_config: dict, measurement: Optional[str] = None) -> str:
+    """Identical discovery calls share one in-flight scan (see services.single_flight).
+
+    The connection config holds tokens and passwords, and keys end up in log
+    lines, so only its hash goes into the key.
+    """
+    config_hash = hashlib.sha256(json.dumps(connection_config, sort_keys=True, default=str).encode()).hexdigest()
+    return json.dumps(["discover", kind, source_type, config_hash, measurement])
+
+def _discover(key: str, fn, *args, **kwargs):
+    """Run a discovery call through single-flight, timed as the request's discovery phase"""
+    with phase("discovery"):
+        return get_single_flight().do(key, fn, *args, **kwargs)
+
 @cbv(datasource_router)
 class DiscoveryRoutes:
     db: Session = Depends(get_db)
@@ -179,7 +197,10 @@ class DiscoveryRoutes:
                 config_dict = json.loads(config_dict)
                 
             discovery_service = get_discovery_service(request.source_type, config_dict)
-            measurements = discovery_service.discover_measurements()
+            measurements = _discover(
+                _discovery_key("measurements", request.source_type, config_dict),
+                discovery_service.discover_measurements
+            )
             
             logger.info(f"Found {len(measurements)} measurements")
             return MeasurementsResponse(measurements=measurements)
@@ -201,7 +222,10 @@ class DiscoveryRoutes:
                 config_dict = json.loads(config_dict)
                 
             discovery_service = get_discovery_service(request.source_type, config_dict)
-            tags = discovery_service.discover_tags(request.measurement)
+            tags = _discover(
+                _discovery_key("tags", request.source_type, config_dict, request.measurement),
+                discovery_service.discover_tags, request.measurement
+            )
             
             logger.info(f"Found {len(tags)} tags for {request.measurement}")
             return TagsResponse(tags=tags)
@@ -223,7 +247,10 @@ class DiscoveryRoutes:
                 config_dict = json.loads(config_dict)
                 
             discovery_service = get_discovery_service(request.source_type, config_dict)
-            fields = discovery_service.discover_fields(request.measurement)
+            fields = _discover(
+                _discovery_key("fields", request.source_type, config_dict, request.measurement),
+                discovery_service.discover_fields, request.measurement
+            )
             
             logger.info(f"Found {len(fields)} fields for {request.measurement}")
             return FieldsResponse(fields=fields)
@@ -245,7 +272,10 @@ class DiscoveryRoutes:
                 config_dict = json.loads(config_dict)
                 
             discovery_service = get_discovery_service(request.source_type, config_dict)
-            sample_data = discovery_service.get_sample_data(request.measurement, limit=5)
+            sample_data = _discover(
+                _discovery_key("sample", request.source_type, config_dict, request.measurement),
+                discovery_service.get_sample_data, request.measurement, limit=5
+            )
             
             logger.info(f"Retrieved {len(sample_data)} sample records for {request.measurement}")
             return SampleDataResponse(sample_data=sample_data)
@@ -272,7 +302,10 @@ class DiscoveryRoutes:
             # Discover fresh data
             connection_config = json.loads(data_source.connection_config)
             discovery_service = get_discovery_service(data_source.source_type, connection_config)
-            measurements = discovery_service.discover_measurements()
+            measurements = _discover(
+                _discovery_key("measurements", data_source.source_type, connection_config),
+                discovery_service.discover_measurements
+            )
             
             # Cache the results
             crud.cache_schema(self.db, source_id, "measurements", {"measurements": measurements})
@@ -395,6 +428,10 @@ class BatchOperationRoutes:
     @datasource_router.post("/{source_id}/auto-map", response_model=AutoMappingResponse)
     def auto_map_measurements(self, source_id: str):
         """Automatically create mappings based on measurement names"""
+        # Discovery across every measurement is heavy; let chart queries go first
+        return get_executor().run_sync(self._auto_map_measurements, source_id)
+
+    def _auto_map_measurements(self, source_id: str):
         try:
             data_source = crud.get_data_source_by_id(self.db, source_id)
             if not data_source:
@@ -576,6 +613,9 @@ class AdvancedOperationRoutes:
     @datasource_router.post("/{source_id}/sync")
     def sync_source_schema(self, source_id: str, force_refresh: bool = Query(False, description="Force refresh cache")):
         """Synchronize source schema and update cache"""
+        return get_executor().run_sync(self._sync_source_schema, source_id, force_refresh)
+
+    def _sync_source_schema(self, source_id: str, force_refresh: bool):
         try:
             data_source = crud.get_data_source_by_id(self.db, source_id)
             if not data_source:
@@ -672,6 +712,9 @@ class AdvancedOperationRoutes:
     @datasource_router.post("/export")
     def export_configurations(self, source_ids: Optional[List[str]] = None, include_configs: bool = False):
         """Export data source configurations"""
+        return get_executor().run_sync(self._export_configurations, source_ids, include_configs)
+
+    def _export_configurations(self, source_ids: Optional[List[str]], include_configs: bool):
         try:
             logger.info(f"Exporting configurations for sources: {source_ids or 'all'}")
             
@@ -887,42 +930,12 @@ class MaintenanceRoutes:
                 maintenance_results["results"]["mapping_validation"] = validation_results
                 logger.info(f"Validated {len(all_mappings)} mappings")
             
-            # Check connections
+            # Check connections (every source is contacted, so it runs as background work)
             if check_connections:
-                all_sources = crud.get_all_data_sources(self.db)
-                connection_results = {
-                    "total_sources": len(all_sources),
-                    "healthy_sources": 0,
-                    "unhealthy_sources": 0,
-                    "connection_errors": []
-                }
-                
-                for source in all_sources:
-                    try:
-                        connection_config = json.loads(source.connection_config)
-                        discovery_service = get_discovery_service(source.source_type, connection_config)
-                        result = discovery_service.test_connection()
-                        
-                        if result.get("success", False):
-                            connection_results["healthy_sources"] += 1
-                        else:
-                            connection_results["unhealthy_sources"] += 1
-                            connection_results["connection_errors"].append({
-                                "source_id": source.source_id,
-                                "source_name": source.source_name,
-                                "error": result.get("message", "Unknown error")
-                            })
-                    except Exception as e:
-                        connection_results["unhealthy_sources"] += 1
-                        connection_results["connection_errors"].append({
-                            "source_id": source.source_id,
-                            "source_name": source.source_name,
-                            "error": str(e)
-                        })
-                
+                connection_results = get_executor().run_sync(self._check_connections)
                 maintenance_results["operations_performed"].append("check_connections")
                 maintenance_results["results"]["connection_check"] = connection_results
-                logger.info(f"Checked {len(all_sources)} data source connections")
+                logger.info(f"Checked {connection_results['total_sources']} data source connections")
             
             logger.info("Maintenance operations completed")
             return maintenance_results
@@ -931,6 +944,41 @@ class MaintenanceRoutes:
             logger.error(f"Maintenance failed: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Maintenance failed: {str(e)}")
 
+    def _check_connections(self):
+        """Test the connection of every data source"""
+        all_sources = crud.get_all_data_sources(self.db)
+        connection_results = {
+            "total_sources": len(all_sources),
+            "healthy_sources": 0,
+            "unhealthy_sources": 0,
+            "connection_errors": []
+        }
+        
+        for source in all_sources:
+            try:
+                connection_config = json.loads(source.connection_config)
+                discovery_service = get_discovery_service(source.source_type, connection_config)
+                result = discovery_service.test_connection()
+                
+                if result.get("success", False):
+                    connection_results["healthy_sources"] += 1
+                else:
+                    connection_results["unhealthy_sources"] += 1
+                    connection_results["connection_errors"].append({
+                        "source_id": source.source_id,
+                        "source_name": source.source_name,
+                        "error": result.get("message", "Unknown error")
+                    })
+            except Exception as e:
+                connection_results["unhealthy_sources"] += 1
+                connection_results["connection_errors"].append({
+                    "source_id": source.source_id,
+                    "source_name": source.source_name,
+                    "error": str(e)
+                })
+        
+        return connection_results
+
     @datasource_router.get("/maintenance/status")
     def get_maintenance_status(self):
         """Get system maintenance status and recommendations"""
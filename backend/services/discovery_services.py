@@ -1,6 +1,5 @@
 # backend/services/discovery_services.py
 import requests
-import duckdb
 import os
 import json
 import logging
@@ -10,6 +9,8 @@ import pandas as pd
 from io import StringIO
 import time
 
+from services.duckdb_engine import DuckDBEngine, get_engine
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -448,10 +449,11 @@ class InfluxDBDiscovery(DataSourceDiscovery):
 class ParquetDiscovery(DataSourceDiscovery):
     """Parquet discovery implementation using DuckDB"""
     
-    def __init__(self, connection_config: dict):
+    def __init__(self, connection_config: dict, engine: Optional[DuckDBEngine] = None):
         super().__init__(connection_config)
         self.base_path = connection_config.get('base_path', '')
         self.path_pattern = connection_config.get('path_pattern', '**/*.parquet')
+        self.engine = engine or get_engine()
     
     def test_connection(self) -> Dict[str, Any]:
         """Test Parquet path access"""
@@ -467,11 +469,11 @@ class ParquetDiscovery(DataSourceDiscovery):
             
             # Try to list some parquet files
             full_pattern = os.path.join(self.base_path, self.path_pattern)
-            con = duckdb.connect(':memory:')
             
             try:
                 # Test reading capability
-                result = con.execute(f"SELECT COUNT(*) FROM read_parquet('{full_pattern}') LIMIT 1").fetchone()
+                with self.engine.cursor() as con:
+                    result = con.execute(f"SELECT COUNT(*) FROM read_parquet('{full_pattern}') LIMIT 1").fetchone()
                 file_count = result[0] if result else 0
                 
                 return {
@@ -489,8 +491,6 @@ class ParquetDiscovery(DataSourceDiscovery):
                     "message": f"Cannot read parquet files: {str(e)}",
                     "details": {"error": str(e)}
                 }
-            finally:
-                con.close()
                 
         except Exception as e:
             logger.error(f"Parquet connection test failed: {e}")
@@ -536,28 +536,23 @@ class ParquetDiscovery(DataSourceDiscovery):
             # Build path pattern for specific equipment
             equipment_pattern = os.path.join(self.base_path, f"**/equipment={measurement}/**/*.parquet")
             
-            con = duckdb.connect(':memory:')
-            
-            try:
-                # Get column names
+            # Get column names
+            with self.engine.cursor() as con:
                 result = con.execute(f"DESCRIBE SELECT * FROM read_parquet('{equipment_pattern}') LIMIT 1").fetchall()
-                
-                # Filter columns that look like tags (typically n_*, id columns, etc.)
-                tag_columns = []
-                for row in result:
-                    column_name = row[0]
-                    # Common tag patterns
-                    if (column_name.startswith('n_') and 
-                        not column_name.startswith('n_soc') and 
-                        not column_name.startswith('n_voltage') and
-                        not column_name.startswith('n_current')):
-                        tag_columns.append(column_name)
-                
-                logger.info(f"Found {len(tag_columns)} tag columns")
-                return tag_columns
-                
-            finally:
-                con.close()
+            
+            # Filter columns that look like tags (typically n_*, id columns, etc.)
+            tag_columns = []
+            for row in result:
+                column_name = row[0]
+                # Common tag patterns
+                if (column_name.startswith('n_') and 
+                    not column_name.startswith('n_soc') and 
+                    not column_name.startswith('n_voltage') and
+                    not column_name.startswith('n_current')):
+                    tag_columns.append(column_name)
+            
+            logger.info(f"Found {len(tag_columns)} tag columns")
+            return tag_columns
             
         except Exception as e:
             logger.error(f"Error discovering tags for {measurement}: {e}")
@@ -571,29 +566,24 @@ class ParquetDiscovery(DataSourceDiscovery):
             # Build path pattern for specific equipment
             equipment_pattern = os.path.join(self.base_path, f"**/equipment={measurement}/**/*.parquet")
             
-            con = duckdb.connect(':memory:')
-            
-            try:
-                # Get column names and types
+            # Get column names and types
+            with self.engine.cursor() as con:
                 result = con.execute(f"DESCRIBE SELECT * FROM read_parquet('{equipment_pattern}') LIMIT 1").fetchall()
-                
-                # Filter columns that look like fields (typically measurement values)
-                field_columns = []
-                for row in result:
-                    column_name, column_type = row[0], row[1]
-                    # Common field patterns - numeric measurements
-                    if (column_name.startswith(('n_soc', 'n_voltage', 'n_current', 'n_temperature', 'n_power')) or
-                        column_name in ['value', 'measurement', 'reading']):
-                        field_columns.append({
-                            "name": column_name,
-                            "type": column_type.lower()
-                        })
-                
-                logger.info(f"Found {len(field_columns)} field columns")
-                return field_columns
-                
-            finally:
-                con.close()
+            
+            # Filter columns that look like fields (typically measurement values)
+            field_columns = []
+            for row in result:
+                column_name, column_type = row[0], row[1]
+                # Common field patterns - numeric measurements
+                if (column_name.startswith(('n_soc', 'n_voltage', 'n_current', 'n_temperature', 'n_power')) or
+                    column_name in ['value', 'measurement', 'reading']):
+                    field_columns.append({
+                        "name": column_name,
+                        "type": column_type.lower()
+                    })
+            
+            logger.info(f"Found {len(field_columns)} field columns")
+            return field_columns
             
         except Exception as e:
             logger.error(f"Error discovering fields for {measurement}: {e}")
@@ -607,27 +597,23 @@ class ParquetDiscovery(DataSourceDiscovery):
             # Build path pattern for specific equipment
             equipment_pattern = os.path.join(self.base_path, f"**/equipment={measurement}/**/*.parquet")
             
-            con = duckdb.connect(':memory:')
-            
-            try:
-                # Get sample data
+            # Get sample data
+            with self.engine.cursor() as con:
                 result = con.execute(f"SELECT * FROM read_parquet('{equipment_pattern}') LIMIT {limit}").fetchdf()
-                
-                return result.to_dict('records')
-                
-            finally:
-                con.close()
+            
+            return result.to_dict('records')
             
         except Exception as e:
             logger.error(f"Error getting sample data for {measurement}: {e}")
             return []
 
 # Factory function to get appropriate discovery service
-def get_discovery_service(source_type: str, connection_config: dict) -> DataSourceDiscovery:
+def get_discovery_service(source_type: str, connection_config: dict,
+                          engine: Optional[DuckDBEngine] = None) -> DataSourceDiscovery:
     """Factory function to get appropriate discovery service"""
     if source_type.lower() == 'influxdb':
         return InfluxDBDiscovery(connection_config)
     elif source_type.lower() == 'parquet':
-        return ParquetDiscovery(connection_config)
+        return ParquetDiscovery(connection_config, engine=engine)
     else:
         raise ValueError(f"Unsupported source type: {source_type}")
\ No newline at end of file
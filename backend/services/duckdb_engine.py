@@ -0,0 +1,184 @@
+# services/duckdb_engine.py
+import duckdb
+import contextvars
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from services.resource_governor import GOVERNED_SETTINGS, set_statement, validate_settings
+
+logger = logging.getLogger(__name__)
+
+class QueryCancelledError(Exception):
+    """Raised when a query is cancelled before or while it runs"""
+
+class QueryToken:
+    """Cancellation handle for one logical query.
+
+    Cursors borrowed while the token is current are registered with it, so
+    cancel() can interrupt whatever DuckDB is executing for that query.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cursors: List = []
+        self.cancelled = False
+        self.reason: Optional[str] = None
+
+    def attach(self, cur):
+        with self._lock:
+            if self.cancelled:
+                raise QueryCancelledError("Query was cancelled")
+            self._cursors.append(cur)
+
+    def detach(self, cur):
+        with self._lock:
+            if cur in self._cursors:
+                self._cursors.remove(cur)
+
+    def cancel(self, reason: str = "cancelled"):
+        """Interrupt every running statement of this query; reason is timeout or cancelled"""
+        with self._lock:
+            self.cancelled = True
+            self.reason = self.reason or reason
+            cursors = list(self._cursors)
+        for cur in cursors:
+            try:
+                cur.interrupt()
+            except Exception as e:
+                logger.warning(f"Failed to interrupt DuckDB cursor: {e}")
+
+current_query_token: contextvars.ContextVar[Optional[QueryToken]] = contextvars.ContextVar("current_query_token", default=None)
+
+class DuckDBEngine:
+    """Long-lived DuckDB database that hands out pooled cursors.
+
+    All cursors share one in-memory database, so the parquet metadata
+    cache and loaded extensions survive between queries.
+    """
+
+    def __init__(self, pool_size: int = 8, database: str = ':memory:', acquire_timeout: float = 30.0,
+                 settings: Optional[Dict[str, Any]] = None):
+        self.database = database
+        self.pool_size = max(1, pool_size)
+        self.acquire_timeout = acquire_timeout
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._connection = duckdb.connect(database=database)
+        self._configure(self._connection)
+        if settings:
+            self.apply_settings(settings)
+
+        self._pool = queue.LifoQueue(maxsize=self.pool_size)
+        for _ in range(self.pool_size):
+            self._pool.put(self._new_cursor())
+
+        logger.info(f"DuckDB engine started with {self.pool_size} pooled cursors")
+
+    def _configure(self, con):
+        """Apply database-wide settings once, at startup"""
+        # Keep parquet footers cached so repeated scans skip metadata reads
+        con.execute("SET enable_object_cache = true")
+        # Query bounds arrive as naive UTC; keep TIMESTAMPTZ columns in the same zone
+        con.execute("SET TimeZone = 'UTC'")
+
+    def _new_cursor(self):
+        """A cursor in the UTC session zone; cursors don't inherit the parent's TimeZone"""
+        cur = self._connection.cursor()
+        cur.execute("SET TimeZone = 'UTC'")
+        return cur
+
+    def apply_settings(self, settings: Dict[str, Any]) -> Dict[str, Any]:
+        """Change resource settings (threads, memory_limit, spill) for every cursor"""
+        settings = validate_settings(settings)
+        with self._lock:
+            for name, value in settings.items():
+                self._connection.execute(set_statement(name, value))
+        logger.info(f"DuckDB settings applied: {settings}")
+        return self.settings()
+
+    def settings(self) -> Dict[str, Any]:
+        """Current values of the governed settings"""
+        with self._lock:
+            return {name: self._connection.execute(f"SELECT current_setting('{name}')").fetchone()[0]
+                    for name in GOVERNED_SETTINGS}
+
+    @contextmanager
+    def cursor(self):
+        """Borrow a cursor from the pool, returning it when the block exits"""
+        if self._closed:
+            raise RuntimeError("DuckDB engine is closed")
+        try:
+            cur = self._pool.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No DuckDB cursor available after {self.acquire_timeout}s")
+
+        borrowed = cur
+        token = current_query_token.get()
+        try:
+            if token is not None:
+                token.attach(borrowed)
+            yield borrowed
+        except duckdb.InterruptException:
+            raise QueryCancelledError("Query was interrupted")
+        except duckdb.FatalException:
+            # The cursor is unusable after a fatal error, replace it
+            logger.error("Replacing DuckDB cursor after fatal error")
+            cur = self._new_cursor()
+            raise
+        finally:
+            if token is not None:
+                token.detach(borrowed)
+            self._pool.put(cur)
+
+    def execute(self, sql: str, params: Optional[list] = None):
+        """Run a statement on a pooled cursor and return all rows"""
+        with self.cursor() as cur:
+            return cur.execute(sql, params or []).fetchall()
+
+    def close(self):
+        """Close every pooled cursor and the underlying database"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+
+        while not self._pool.empty():
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+        self._connection.close()
+        logger.info("DuckDB engine closed")
+
+
+# ---------- Application-wide engine ----------
+_engine: Optional[DuckDBEngine] = None
+_engine_lock = threading.Lock()
+
+def init_engine(**kwargs) -> DuckDBEngine:
+    """Create the shared engine (called once at app startup)"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = DuckDBEngine(**kwargs)
+        return _engine
+
+def get_engine() -> DuckDBEngine:
+    """Return the shared engine, creating it with defaults if needed"""
+    if _engine is None:
+        from config import DUCKDB_POOL_SIZE
+        from services.resource_governor import configured_settings
+        return init_engine(pool_size=DUCKDB_POOL_SIZE, settings=configured_settings())
+    return _engine
+
+def shutdown_engine():
+    """Close the shared engine (called at app shutdown)"""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.close()
+            _engine = None
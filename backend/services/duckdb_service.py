@@ -1,18 +1,37 @@
 # services/duckdb_service.py
 
-import duckdb
-from config import BASE_PARQUET_PATH
+from config import ROLLUP_PARQUET_PATH, ROLLUP_RESOLUTIONS, ROLLUP_TAG_COLUMNS
+from config import ROLLUP_LAZY_BUILD, ROLLUP_LAZY_BUILD_MAX_LEAVES
+from config import QUERY_DEFAULT_MAX_POINTS, QUERY_SCAN_BUDGET_ROWS
+from services.duckdb_engine import DuckDBEngine, get_engine
+from services.parquet_catalog import ParquetCatalog, ParquetFileStats, get_catalog, normalize_time
+from services.rollup_service import choose_rollup, ensure_leaf_rollup, is_fresh, rollup_columns, rollup_leaf_path, rollup_row_count
+from services.query_cache import QueryResultCache, canonical_filters
+from services.metrics import RESULT_ROWS, phase
+from services.slow_query_log import watch_query
+from models.filters import QueryFilters
+from services.query_filters import compile_conditions, pruning_predicates, split_conditions, with_equipment_conditions
 import os
-from datetime import datetime
+import re
+import logging
+import math
+import time
+import pandas as pd
+import pyarrow as pa
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-def get_window_unit(FromDate: str, ToDate: str) -> str:
-    """Calculate resampling window period for time-series data."""
-    max_points = 100
-    start = datetime.fromisoformat(FromDate.replace("Z", "+00:00"))
-    end = datetime.fromisoformat(ToDate.replace("Z", "+00:00"))
-    duration = (end - start) / max_points
+def get_window_unit(FromDate: str, ToDate: str, max_points: int = QUERY_DEFAULT_MAX_POINTS) -> Tuple[int, str]:
+    """Smallest whole-second window that splits the range into at most max_points buckets.
 
-    days, seconds = duration.days, duration.seconds
+    Returns (seconds, label), e.g. (900, '15min').
+    """
+    duration = normalize_time(ToDate) - normalize_time(FromDate)
+    window = timedelta(seconds=max(1, math.ceil(duration.total_seconds() / max(1, max_points))))
+
+    days, seconds = window.days, window.seconds
     hours, minutes = divmod(seconds, 3600)
     minutes, seconds = divmod(minutes, 60)
 
@@ -22,67 +41,768 @@ def get_window_unit(FromDate: str, ToDate: str) -> str:
         f"{minutes}min" if minutes else "",
         f"{seconds}s" if seconds else "",
     ]
-    return duration.seconds, "".join(filter(None, parts))
-
-def query_parquet_data(filters):
-    # Build wildcard path
-    path_parts = [
-        f"year={filters.year if filters.year else '*'}",
-        f"month={str(filters.month).zfill(2) if filters.month else '*'}",
-        f"day={str(filters.day).zfill(2) if filters.day else '*'}",
-        f"equipment={filters.equipment if filters.equipment else '*'}",
-        f"dcu={filters.dcu if filters.dcu else '*'}",
-        "*.parquet"
-    ]
-    query_path = os.path.join(BASE_PARQUET_PATH, *path_parts)
+    return int(window.total_seconds()), "".join(filter(None, parts))
 
-    con = duckdb.connect(database=':memory:')
+_INTERVAL = re.compile(r"^\s*(\d+)\s*(seconds?|secs?|s|minutes?|mins?|m|hours?|h|days?|d|weeks?|w)\s*$", re.IGNORECASE)
+_UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
 
-    selected_metrics = filters.metrics if filters.metrics else ["*"]
+def interval_seconds(window_period: Optional[str]) -> Optional[int]:
+    """Length of a fixed interval such as '1 hour' or '15 minutes' (None for months/years)"""
+    match = _INTERVAL.match(window_period or "")
+    if not match:
+        return None
+    count, unit = match.groups()
+    return int(count) * _UNIT_SECONDS[unit[0].lower()]
 
-    # Build dynamic WHERE clause
-    base_conditions = [
-        f"t_sampling_time BETWEEN '{filters.start_time}' AND '{filters.end_time}'"
-    ]
-    if filters.where_args:
-        base_conditions.extend(filters.where_args)
+def parse_timestamp(value: str) -> datetime:
+    """Parse an ISO timestamp as sent by the UI (a trailing 'Z' is allowed)"""
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+def partition_paths(filters, catalog: ParquetCatalog) -> List[str]:
+    """File globs of the leaf partitions a query reads, one per leaf directory.
+
+    Leaves come from the catalog's in-memory index, so resolving a query
+    costs no stat or glob. The time range alone decides the days;
+    year/month/day filters only apply to requests without one.
+    """
+    keys = {"equipment": filters.equipment or None, "dcu": filters.dcu or None}
+    if filters.start_time and filters.end_time:
+        # Partitions are UTC days, like every other bound of the query
+        first_day = normalize_time(parse_timestamp(filters.start_time)).date()
+        last_day = normalize_time(parse_timestamp(filters.end_time)).date()
+        leaves = catalog.find_leaves(first_day, last_day, **keys)
+    else:
+        leaves = catalog.find_leaves(year=filters.year or None,
+                                     month=f"{filters.month:02d}" if filters.month else None,
+                                     day=f"{filters.day:02d}" if filters.day else None, **keys)
+    return [os.path.join(leaf_dir, "*.parquet") for leaf_dir in leaves]
+
+def filter_predicates(filters) -> List[tuple]:
+    """(column, op, value) bounds of the request's filters, usable for file pruning"""
+    conditions, _ = split_conditions(filters)
+    return pruning_predicates(conditions)
+
+def _where(filters, prefix: str = "p") -> Tuple[str, Dict[str, Any]]:
+    """Parameterized WHERE fragment for the request's filters"""
+    conditions, raw = split_conditions(filters)
+    return compile_conditions(conditions, raw, prefix=prefix)
+
+def resolve_file_stats(filters, catalog: Optional[ParquetCatalog] = None) -> List[ParquetFileStats]:
+    """Catalog entries of the parquet files a query reads, pruned by partition, time and tag statistics"""
+    catalog = catalog or get_catalog()
+    paths = partition_paths(filters, catalog)
+    return catalog.files(
+        paths,
+        start=filters.start_time,
+        end=filters.end_time,
+        predicates=filter_predicates(filters)
+    )
+
+def resolve_files(filters, catalog: Optional[ParquetCatalog] = None) -> List[str]:
+    """Explicit parquet file list for a query, pruned by partition, time and tag statistics"""
+    return [f.path for f in resolve_file_stats(filters, catalog)]
+
+logger = logging.getLogger(__name__)
+
+def _window_period(filters) -> str:
+    """The requested window, or the automatic one derived from the time range"""
+    if filters.window_period:
+        return filters.window_period
+    window_seconds, _ = get_window_unit(filters.start_time, filters.end_time)
+    return f"{window_seconds} seconds"
+
+def time_type(files: List[ParquetFileStats]) -> str:
+    """DuckDB type of t_sampling_time across the files.
+
+    VARCHAR if any file stores it as text, else TIMESTAMPTZ if any stores it
+    tz-aware, else TIMESTAMP.
+    """
+    types = {f.time_type for f in files}
+    for column_type in ("VARCHAR", "TIMESTAMPTZ"):
+        if column_type in types:
+            return column_type
+    return "TIMESTAMP"
+
+def _time_expr(column: str, column_type: str) -> str:
+    """The time column as compared and bucketed: text stores are cast row by row"""
+    return f"CAST({column} AS TIMESTAMP)" if column_type == "VARCHAR" else column
+
+def _bound_type(column_type: str) -> str:
+    """Type $start/$end are cast to so they match _time_expr"""
+    return "TIMESTAMP" if column_type == "VARCHAR" else column_type
+
+def _naive(expr: str, column_type: str) -> str:
+    """expr as naive UTC; the engine's TimeZone is UTC, so the cast keeps the wall time"""
+    return f"CAST({expr} AS TIMESTAMP)" if column_type == "TIMESTAMPTZ" else expr
+
+def _bucket_expr(window: str, column: str = "t_sampling_time", column_type: str = "TIMESTAMP") -> str:
+    """time_bucket() expression for a window such as '1 hour'.
+
+    Buckets the column in its stored type, anchored at $start cast to that
+    type; the bucket itself comes back as naive UTC, like every response.
+    """
+    bucket = (f"time_bucket(INTERVAL '{window}', {_time_expr(column, column_type)}, "
+              f"CAST($start AS {_bound_type(column_type)}))")
+    return f"{_naive(bucket, column_type)} AS bucket_time"
+
+def time_range(column_type: str = "TIMESTAMP") -> str:
+    """Range predicate on the native column with $start/$end cast to its type.
+
+    Column and bounds share a type, so DuckDB pushes the range into the
+    parquet scan and skips row groups by their min/max statistics. Text
+    columns can't be compared with timestamps and keep the per-row cast.
+    """
+    bound = _bound_type(column_type)
+    return f"{_time_expr('t_sampling_time', column_type)} BETWEEN CAST($start AS {bound}) AND CAST($end AS {bound})"
+
+def time_params(filters) -> Dict[str, Optional[datetime]]:
+    """Query bounds parsed once into the typed $start/$end parameters"""
+    return {"start": normalize_time(filters.start_time), "end": normalize_time(filters.end_time)}
+
+def tail_filters(filters):
+    """Rewrite a 'since' request into a query over its trailing buckets only.
+
+    The bucket width and grid stay those of the full start_time..end_time
+    range, so the buckets returned line up with the ones the client holds;
+    `since` itself is re-scanned because it may still have been filling.
+    """
+    since = normalize_time(getattr(filters, "since", None))
+    if since is None or not filters.start_time or not filters.end_time:
+        return filters
+
+    start, end = normalize_time(filters.start_time), normalize_time(filters.end_time)
+    if since <= start:
+        return filters.model_copy(update={"since": None})
+
+    window = _window_period(filters)
+    seconds = interval_seconds(window)
+    since = min(since, end)
+    if seconds:
+        # Snap onto the bucket grid anchored at start_time
+        since = start + timedelta(seconds=int((since - start).total_seconds() // seconds * seconds))
+
+    return filters.model_copy(update={"start_time": since.isoformat(), "window_period": window, "since": None})
+
+# Candidate bucket widths (seconds) for automatic windows; all divide a day
+# or a week evenly, so they line up with the rollup resolutions
+NICE_WINDOWS = [1, 2, 5, 10, 15, 30, 60, 120, 300, 600, 900, 1800, 3600,
+                7200, 10800, 21600, 43200, 86400, 604800]
 
-    where_clause = " AND ".join(base_conditions)
+def requested_points(filters) -> int:
+    """Bucket count the chart can show: max_points, capped at one per pixel"""
+    limits = [n for n in (getattr(filters, "max_points", None), getattr(filters, "width_px", None)) if n]
+    return max(1, min(limits)) if limits else QUERY_DEFAULT_MAX_POINTS
 
-    # Determine time bucket
-    if not filters.window_period:
-        window_seconds = get_window_unit(filters.start_time, filters.end_time)
-        bucket_expr = f"time_bucket(INTERVAL '{window_seconds} seconds', CAST(t_sampling_time AS TIMESTAMP), TIMESTAMP '{filters.start_time}') AS bucket_time"
+def estimate_scan_rows(filters, catalog: ParquetCatalog) -> int:
+    """Rows a query would read, from parquet footer row counts.
+
+    Days routed to a rollup count that rollup file's rows instead of the
+    raw rows, so coarser windows that hit rollups come out cheaper.
+    """
+    predicates = filter_predicates(filters)
+    # Estimation never builds rollups; missing ones are counted as raw rows
+    plan = _plan_rollup(filters, catalog, build=False)
+    if plan is None:
+        patterns, rollup_rows = partition_paths(filters, catalog), 0
     else:
-        bucket_expr = f"time_bucket(INTERVAL '{filters.window_period}', CAST(t_sampling_time AS TIMESTAMP), TIMESTAMP '{filters.start_time}') AS bucket_time"
+        rollup_files, raw_leaves = plan
+        patterns = [os.path.join(leaf_dir, "*.parquet") for leaf_dir in raw_leaves]
+        rollup_rows = sum(rollup_row_count(f) for f in rollup_files)
+    raw_files = catalog.files(patterns, start=filters.start_time, end=filters.end_time, predicates=predicates)
+    return rollup_rows + sum(f.row_count for f in raw_files)
+
+def plan_window(filters, catalog: ParquetCatalog, scan_budget: int = QUERY_SCAN_BUDGET_ROWS):
+    """Pick window_period for requests that leave it empty.
+
+    Starts from the finest nice width that keeps the bucket count within
+    the chart's point budget and coarsens until the estimated scan fits
+    scan_budget. Explicit window_period values are left alone.
+    """
+    if filters.window_period or not filters.start_time or not filters.end_time:
+        return filters
+
+    span = (normalize_time(filters.end_time) - normalize_time(filters.start_time)).total_seconds()
+    points = requested_points(filters)
+    candidates = [w for w in NICE_WINDOWS if w * points >= span]
+    if not candidates:
+        candidates = [math.ceil(span / points / 86400) * 86400]
+
+    best = None
+    for seconds in candidates:
+        planned = filters.model_copy(update={"window_period": f"{seconds} seconds"})
+        rows = estimate_scan_rows(planned, catalog)
+        if rows <= scan_budget:
+            return planned
+        if best is None or rows < best[0]:
+            best = (rows, planned)
+
+    logger.warning(f"No window keeps the scan within {scan_budget} rows, "
+                   f"using {best[1].window_period} (~{best[0]} rows)")
+    return best[1]
+
+def _prepare(filters, catalog: ParquetCatalog):
+    """Resolve equipment filters and the automatic window on the full range, then narrow to the tail"""
+    with phase("resolve"):
+        filters = with_equipment_conditions(filters)
+        return tail_filters(plan_window(filters, catalog))
+
+def _round_metrics(result, metrics: List[str]):
+    """Round numeric metric columns to 2 decimals (skip bool)"""
+    for col in metrics:
+        if col != "t_sampling_time" and col in result.columns:
+            if result[col].dtype in ['float64', 'float32', 'int64', 'int32']:
+                result[col] = result[col].round(2)
+    return result
+
+def _empty_result(metrics: List[str], group_by: Tuple[str, ...] = ()):
+    return pd.DataFrame(columns=["bucket_time", *group_by] + [m for m in metrics if m not in ("*", "t_sampling_time")])
+
+def _group_by(filters) -> Tuple[str, ...]:
+    """Tag columns the request splits its series by"""
+    return tuple(getattr(filters, "group_by", None) or ())
+
+def _metric_names(filters) -> List[str]:
+    return [m for m in (filters.metrics if filters.metrics else ["*"]) if m != "t_sampling_time"]
+
+def _cached(filters, catalog: ParquetCatalog, cache: Optional[QueryResultCache], compute, **key_extra):
+    """Serve repeated requests from the result cache while their partitions are unchanged"""
+    if cache is None:
+        return compute()
+    cache_key = canonical_filters(filters, **key_extra)
+    signature = catalog.versions(catalog.leaf_dirs(partition_paths(filters, catalog)))
+    cached = cache.get(cache_key, signature)
+    if cached is not None:
+        return cached
+    result = compute()
+    cache.put(cache_key, signature, result)
+    return result
+
+def query_parquet_data(filters, engine: Optional[DuckDBEngine] = None, catalog: Optional[ParquetCatalog] = None,
+                       cache: Optional[QueryResultCache] = None):
+    catalog = catalog or get_catalog()
+    prepared = _prepare(filters, catalog)
+    return _cached(prepared, catalog, cache, lambda: _run_query(prepared, engine, catalog, original=filters))
+
+def query_parquet_arrow(filters, engine: Optional[DuckDBEngine] = None, catalog: Optional[ParquetCatalog] = None,
+                        cache: Optional[QueryResultCache] = None) -> pa.Table:
+    """Same query as query_parquet_data, returned as an Arrow table without pandas.
+
+    Rounding and timestamp formatting happen in SQL, so the table can be
+    serialized as-is.
+    """
+    catalog = catalog or get_catalog()
+    prepared = _prepare(filters, catalog)
+    return _cached(prepared, catalog, cache, lambda: _run_arrow_query(prepared, engine, catalog, original=filters),
+                   format="arrow")
+
+def build_query_sql(filters, catalog: ParquetCatalog) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """(SQL, parameters) answering a QueryFilters request, or None when no file can match.
+
+    The SQL text only depends on the metrics, window, aggregation and the
+    shape of the filters; files, time bounds and filter values are bound
+    as parameters, so the text is built once per shape and reused.
+    """
+    # Answer from pre-aggregated rollups where the window allows it
+    plan = _plan_rollup(filters, catalog, build=True)
+    if plan:
+        return _rollup_sql(filters, catalog, *plan)
+
+    # Only open the files whose partition and footer statistics can match
+    file_stats = resolve_file_stats(filters, catalog)
+    if not file_stats:
+        return None
+    column_type = time_type(file_stats)
+
+    where_sql, params = _where(filters)
+    params.update(time_params(filters), files=[f.path for f in file_stats])
+    metrics = tuple(_metric_names(filters))
+    window = _window_period(filters)
+    group_by = _group_by(filters)
+
+    aggregation = _aggregation(filters)
+    if aggregation != "avg" and "*" in metrics:
+        raise ValueError(f"aggregation '{aggregation}' needs explicit metrics")
+    if aggregation != "avg" and group_by:
+        raise ValueError(f"group_by is not supported with aggregation '{aggregation}'")
+    if aggregation == "m4":
+        return _m4_sql(metrics, window, where_sql, column_type), params
+    if aggregation == "lttb":
+        return _lttb_sql(metrics, window, where_sql, column_type), params
+    return _avg_sql(metrics, window, where_sql, group_by, column_type), params
+
+def _group_sql(group_by: Tuple[str, ...]) -> Tuple[str, str]:
+    """(', tag, ...' select list, '1, 2, ...' GROUP BY positions) with the bucket first"""
+    columns = "".join(f", {column}" for column in group_by)
+    positions = ", ".join(str(i) for i in range(1, len(group_by) + 2))
+    return columns, positions
+
+@lru_cache(maxsize=256)
+def _avg_sql(metrics: Tuple[str, ...], window: str, where_sql: str, group_by: Tuple[str, ...] = (),
+             column_type: str = "TIMESTAMP") -> str:
+    """Bucketed AVG of every metric over $files, one row per bucket and tag combination"""
+    tag_columns, group_positions = _group_sql(group_by)
 
     # Build SELECT expressions
     select_exprs = ", ".join(
-        [f"AVG({metric}) AS {metric}" for metric in selected_metrics if metric != "t_sampling_time"]
+        [f"AVG({metric}) AS {metric}" for metric in metrics]
     )
 
     # Final SQL
+    return f"""
+        SELECT * FROM (
+            SELECT {_bucket_expr(window, column_type=column_type)}{tag_columns}, {select_exprs}
+            FROM (
+                SELECT * FROM read_parquet($files, hive_partitioning = true)
+                WHERE {time_range(column_type)} AND {where_sql}
+            )
+            GROUP BY {group_positions}
+        )
+        WHERE bucket_time BETWEEN $start AND $end
+        ORDER BY bucket_time{tag_columns}
+    """
+
+def _run_query(filters, engine: Optional[DuckDBEngine], catalog: ParquetCatalog, original=None):
+    selected_metrics = filters.metrics if filters.metrics else ["*"]
+    started = time.perf_counter()
+    with phase("resolve"):
+        query = build_query_sql(filters, catalog)
+    if query is None:
+        return _empty_result(selected_metrics, _group_by(filters))
+
+    sql, params = query
+    logger.debug(sql)
+    engine = engine or get_engine()
+    with engine.cursor() as con, watch_query(filters, sql, params, started, con=con, original=original,
+                                             rows_scanned=lambda: estimate_scan_rows(filters, catalog)) as outcome:
+        with phase("scan"):
+            result = con.execute(sql, params).fetchdf()
+        outcome["rows"] = len(result)
+    RESULT_ROWS.observe(len(result))
+
+    with phase("postprocess"):
+        return _round_metrics(result, selected_metrics)
+
+def _formatted_sql(sql: str, metrics: List[str], group_by: Tuple[str, ...] = ()) -> str:
+    """Wrap a query so timestamps come back as strings and metrics rounded to 2 decimals"""
+    tag_columns, group_positions = _group_sql(group_by)
+    columns = ", ".join(f"round({m}, 2) AS {m}" for m in metrics)
+    return f"""
+        SELECT strftime(bucket_time, '%Y-%m-%d %H:%M:%S') AS bucket_time{tag_columns}, {columns}
+        FROM ({sql})
+        ORDER BY {group_positions}
+    """
+
+def _run_arrow_query(filters, engine: Optional[DuckDBEngine], catalog: ParquetCatalog, original=None) -> pa.Table:
+    metrics = _metric_names(filters)
+    group_by = _group_by(filters)
+    started = time.perf_counter()
+    with phase("resolve"):
+        query = build_query_sql(filters, catalog)
+    if query is None:
+        return pa.table({"bucket_time": pa.array([], pa.string()),
+                         **{g: pa.array([], pa.int64()) for g in group_by},
+                         **{m: pa.array([], pa.float64()) for m in metrics}})
+
+    sql, params = query
+    sql = _formatted_sql(sql, metrics, group_by)
+    logger.debug(sql)
+    engine = engine or get_engine()
+    with engine.cursor() as con, watch_query(filters, sql, params, started, con=con, original=original,
+                                             rows_scanned=lambda: estimate_scan_rows(filters, catalog)) as outcome:
+        with phase("scan"):
+            table = con.execute(sql, params).fetch_arrow_table()
+        outcome["rows"] = table.num_rows
+    RESULT_ROWS.observe(table.num_rows)
+    return table
+
+@contextmanager
+def open_record_batch_reader(filters, engine: Optional[DuckDBEngine] = None,
+                             catalog: Optional[ParquetCatalog] = None,
+                             batch_size: int = 65536) -> Iterator[pa.RecordBatchReader]:
+    """Stream a query's result as Arrow record batches.
+
+    The pooled cursor stays borrowed until the block exits, so callers must
+    consume the reader inside the with-block. Nothing is cached or
+    materialized, which keeps large exports at constant memory. The
+    slow-query log times the whole stream, until the block exits.
+    """
+    catalog = catalog or get_catalog()
+    started = time.perf_counter()
+    original = filters
+    filters = _prepare(filters, catalog)
+    metrics = _metric_names(filters)
+    query = build_query_sql(filters, catalog)
+    if query is None:
+        schema = pa.schema([("bucket_time", pa.timestamp("us"))] + [(g, pa.int64()) for g in _group_by(filters)]
+                           + [(m, pa.float64()) for m in metrics])
+        yield pa.RecordBatchReader.from_batches(schema, [])
+        return
+
+    sql, params = query
+    sql = f"SELECT * FROM ({sql}) ORDER BY {_group_sql(_group_by(filters))[1]}"
+    logger.debug(sql)
+    engine = engine or get_engine()
+    with engine.cursor() as con, watch_query(filters, sql, params, started, con=con, original=original,
+                                             rows_scanned=lambda: estimate_scan_rows(filters, catalog)) as outcome:
+        reader = con.execute(sql, params).fetch_record_batch(batch_size)
+        outcome["rows"] = 0
+
+        def counted():
+            for batch in reader:
+                outcome["rows"] += batch.num_rows
+                yield batch
+        yield pa.RecordBatchReader.from_batches(reader.schema, counted())
+
+# ---------- Rollup routing ----------
+def _plan_rollup(filters, catalog: ParquetCatalog, build: bool = False) -> Optional[tuple]:
+    """Split the query's day partitions into rollup files and raw leaves.
+
+    Days fully inside the range whose rollup is fresh are read from the
+    coarsest rollup that nests in the window. With build=True (the query
+    that actually runs) finished days without a fresh rollup get one built
+    on the spot, since their partition no longer changes; edge days and
+    today's partition fall back to the raw files. Returns None when no
+    rollup applies.
+    """
+    metrics = [m for m in filters.metrics or [] if m != "t_sampling_time"]
+    window = interval_seconds(filters.window_period)
+    if not metrics or not window or not filters.start_time or not filters.end_time:
+        return None
+    # Rollups hold bucket partials, downsampling modes need the raw points
+    if _aggregation(filters) != "avg":
+        return None
+
+    # Rollups only keep the tag columns, so every filter must be a typed tag condition
+    conditions, raw = split_conditions(filters)
+    if raw or any(c.column not in ROLLUP_TAG_COLUMNS for c in conditions):
+        return None
+    if any(column not in ROLLUP_TAG_COLUMNS for column in _group_by(filters)):
+        return None
+
+    start, end = normalize_time(filters.start_time), normalize_time(filters.end_time)
+    midnight = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    choice = choose_rollup(window, (start - midnight).total_seconds(), ROLLUP_RESOLUTIONS)
+    if not choice:
+        return None
+    resolution, seconds = choice
+
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    lazy_builds = ROLLUP_LAZY_BUILD_MAX_LEAVES if ROLLUP_LAZY_BUILD and build else 0
+    rollup_files, raw_leaves = [], []
+    for leaf_dir in catalog.leaf_dirs(partition_paths(filters, catalog)):
+        raw_files = catalog.leaf_files(leaf_dir)
+        if not raw_files:
+            continue
+        try:
+            part = raw_files[0].partition
+            day_start = datetime(int(part["year"]), int(part["month"]), int(part["day"]))
+        except (KeyError, ValueError):
+            raw_leaves.append(leaf_dir)
+            continue
+
+        rollup_file = rollup_leaf_path(ROLLUP_PARQUET_PATH, catalog.base_path, leaf_dir, resolution)
+        covered = day_start >= start and day_start + timedelta(days=1) <= end + timedelta(seconds=1)
+        fresh = covered and is_fresh(rollup_file, [f.mtime for f in raw_files])
+        if covered and not fresh and day_start < today and lazy_builds > 0:
+            lazy_builds -= 1
+            fresh = ensure_leaf_rollup(leaf_dir, resolution, seconds, ROLLUP_PARQUET_PATH,
+                                       ROLLUP_TAG_COLUMNS, catalog=catalog) is not None
+        if fresh and all(f"{m}__sum" in rollup_columns(rollup_file) for m in metrics):
+            rollup_files.append(rollup_file)
+        else:
+            raw_leaves.append(leaf_dir)
+
+    if not rollup_files:
+        return None
+    return rollup_files, raw_leaves
+
+def _rollup_sql(filters, catalog: ParquetCatalog, rollup_files: List[str],
+                raw_leaves: List[str]) -> Tuple[str, Dict[str, Any]]:
+    """Merge sum/count partials from rollups and raw edge days into AVG per bucket"""
+    metrics = [m for m in filters.metrics if m != "t_sampling_time"]
+    window = _window_period(filters)
+    tag_columns, group_positions = _group_sql(_group_by(filters))
+    tag_filter, params = _where(filters)
+    params.update(time_params(filters), rollup_files=rollup_files)
+
+    rollup_sums = ", ".join(f'SUM("{m}__sum") AS "{m}__sum", SUM("{m}__count") AS "{m}__count"' for m in metrics)
+    parts = [f"""
+                SELECT {_bucket_expr(window, "bucket_time")}{tag_columns}, {rollup_sums}
+                FROM read_parquet($rollup_files, hive_partitioning = false)
+                WHERE {tag_filter}
+                GROUP BY {group_positions}"""]
+
+    raw_files = catalog.files(
+        [os.path.join(leaf_dir, "*.parquet") for leaf_dir in raw_leaves],
+        start=filters.start_time,
+        end=filters.end_time,
+        predicates=filter_predicates(filters)
+    )
+    if raw_files:
+        params["files"] = [f.path for f in raw_files]
+        raw_sums = ", ".join(f'SUM({m}) AS "{m}__sum", COUNT({m}) AS "{m}__count"' for m in metrics)
+        column_type = time_type(raw_files)
+        parts.append(f"""
+                SELECT {_bucket_expr(window, column_type=column_type)}{tag_columns}, {raw_sums}
+                FROM read_parquet($files, hive_partitioning = true)
+                WHERE {time_range(column_type)} AND {tag_filter}
+                GROUP BY {group_positions}""")
+
+    averages = ", ".join(f'SUM("{m}__sum") / SUM("{m}__count") AS {m}' for m in metrics)
+    sql = f"""
+        WITH partials AS ({" UNION ALL BY NAME ".join(parts)}
+        )
+        SELECT bucket_time{tag_columns}, {averages}
+        FROM partials
+        GROUP BY {group_positions}
+        HAVING bucket_time BETWEEN $start AND $end
+        ORDER BY {group_positions}
+    """
+    return sql, params
+
+# ---------- Visual downsampling ----------
+def _aggregation(filters) -> str:
+    return getattr(filters, "aggregation", None) or "avg"
+
+def _series_sql(metrics: Tuple[str, ...], where_sql: str, column_type: str) -> str:
+    """One point per timestamp (rows sharing a timestamp averaged), the input of M4 and LTTB.
+
+    ts is naive UTC; it is cast per point after grouping on the native column.
+    """
+    averages = ", ".join(f"AVG({m}) AS {m}" for m in metrics)
+    return f"""
+                SELECT {_naive(_time_expr("t_sampling_time", column_type), column_type)} AS ts, {averages}
+                FROM read_parquet($files, hive_partitioning = true)
+                WHERE {time_range(column_type)} AND {where_sql}
+                GROUP BY t_sampling_time"""
+
+@lru_cache(maxsize=256)
+def _m4_sql(metrics: Tuple[str, ...], window: str, where_sql: str, column_type: str = "TIMESTAMP") -> str:
+    """M4: per bucket (pixel column) keep the first, last, min and max point of every metric.
+
+    Drawing those points reproduces the line chart of the full series, so
+    spikes and sags survive at a few points per pixel. Rows keep their own
+    timestamps, returned as bucket_time.
+    """
+    extremes = ", ".join(f'arg_min(ts, {m}) OVER w AS "{m}__tmin", arg_max(ts, {m}) OVER w AS "{m}__tmax"'
+                         for m in metrics)
+    keep = ", ".join(["__first", "__last"] + [f'"{m}__tmin", "{m}__tmax"' for m in metrics])
+    return f"""
+        WITH bucketed AS (
+            SELECT *, {_bucket_expr(window, "ts")}
+            FROM ({_series_sql(metrics, where_sql, column_type)})
+        ),
+        framed AS (
+            SELECT *, min(ts) OVER w AS __first, max(ts) OVER w AS __last, {extremes}
+            FROM bucketed
+            WINDOW w AS (PARTITION BY bucket_time)
+        )
+        SELECT ts AS bucket_time, {", ".join(metrics)}
+        FROM framed
+        WHERE ts IN ({keep})
+        ORDER BY ts
+    """
+
+@lru_cache(maxsize=256)
+def _lttb_sql(metrics: Tuple[str, ...], window: str, where_sql: str, column_type: str = "TIMESTAMP") -> str:
+    """Approximate Largest-Triangle-Three-Buckets, one point per bucket and metric.
+
+    Exact LTTB anchors each triangle on the point picked in the previous
+    bucket, which is inherently sequential; here both anchors are the
+    neighbouring bucket averages, so every bucket is decided independently
+    in one set-based pass. First and last buckets keep their edge points.
+    """
+    anchors = ", ".join(f'lag(AVG({m})) OVER o AS "{m}__prev", lead(AVG({m})) OVER o AS "{m}__next"'
+                        for m in metrics)
+    # Twice the area of the triangle (previous average, point, next average)
+    picks = ", ".join(
+        f"""COALESCE(
+                arg_max(b.ts, abs((a.__prev_x - a.__next_x) * (b.{m} - a."{m}__prev")
+                                  - (a.__prev_x - b.__x) * (a."{m}__next" - a."{m}__prev"))),
+                CASE WHEN any_value(a.__prev_x) IS NULL THEN min(b.ts) ELSE max(b.ts) END
+            ) AS {m}__pick"""
+        for m in metrics
+    )
+    return f"""
+        WITH bucketed AS MATERIALIZED (
+            SELECT *, {_bucket_expr(window, "ts")}, epoch(ts) AS __x
+            FROM ({_series_sql(metrics, where_sql, column_type)})
+        ),
+        anchors AS (
+            SELECT bucket_time, lag(AVG(__x)) OVER o AS __prev_x, lead(AVG(__x)) OVER o AS __next_x, {anchors}
+            FROM bucketed
+            GROUP BY bucket_time
+            WINDOW o AS (ORDER BY bucket_time)
+        ),
+        picked AS (
+            SELECT {picks}
+            FROM bucketed b JOIN anchors a USING (bucket_time)
+            GROUP BY b.bucket_time
+        )
+        SELECT ts AS bucket_time, {", ".join(metrics)}
+        FROM bucketed
+        WHERE ts IN (SELECT UNNEST([{", ".join(f"{m}__pick" for m in metrics)}]) FROM picked)
+        ORDER BY ts
+    """
+
+# ---------- Batch queries ----------
+def _scan_key(filters) -> tuple:
+    """Requests with the same key read the same files and share one scan"""
+    return (filters.equipment, filters.dcu, filters.year, filters.month, filters.day,
+            filters.start_time, filters.end_time, filters.window_period)
+
+def query_parquet_batch(filters_list: List, engine: Optional[DuckDBEngine] = None,
+                        catalog: Optional[ParquetCatalog] = None,
+                        cache: Optional[QueryResultCache] = None) -> List:
+    """Run many widget queries, sharing one raw scan per equipment/dcu/time range.
+
+    Requests that rollups can answer run on their own through the rollup
+    plan. Returns one DataFrame per request, in request order.
+    """
+    catalog = catalog or get_catalog()
+    originals = filters_list
+    filters_list = [_prepare(filters, catalog) for filters in filters_list]
+    results: List = [None] * len(filters_list)
+    pending = {}
+
+    for index, filters in enumerate(filters_list):
+        if cache is not None:
+            key = canonical_filters(filters)
+            signature = catalog.versions(catalog.leaf_dirs(partition_paths(filters, catalog)))
+            cached = cache.get(key, signature)
+            if cached is not None:
+                results[index] = cached
+                continue
+        # Downsampling modes and grouped series need their own scan, and so do
+        # requests a rollup answers (planning may build the rollups they need)
+        shareable = (_aggregation(filters) == "avg" and not _group_by(filters)
+                     and _plan_rollup(filters, catalog, build=True) is None)
+        key = _scan_key(filters) if shareable else ("single", index)
+        pending.setdefault(key, []).append(index)
+
+    for indexes in pending.values():
+        members = [filters_list[i] for i in indexes]
+        frames = _run_shared_scan(members, engine, catalog, original=originals[indexes[0]])
+        for index, frame in zip(indexes, frames):
+            results[index] = frame
+            if cache is not None:
+                filters = filters_list[index]
+                signature = catalog.versions(catalog.leaf_dirs(partition_paths(filters, catalog)))
+                cache.put(canonical_filters(filters), signature, frame)
+
+    return results
+
+def _run_shared_scan(members: List, engine: Optional[DuckDBEngine], catalog: ParquetCatalog, original=None) -> List:
+    """One read_parquet pass computing every member's metrics under its own filters.
+
+    The slow-query log records the pass once, as the first member's request.
+    """
+    if len(members) == 1:
+        return [_run_query(members[0], engine, catalog, original=original)]
+
+    started = time.perf_counter()
+    with phase("resolve"):
+        file_stats = {f.path: f for filters in members for f in resolve_file_stats(filters, catalog)}
+    if not file_stats:
+        return [_empty_result(filters.metrics or []) for filters in members]
+
+    engine = engine or get_engine()
+    first = members[0]
+    column_type = time_type(list(file_stats.values()))
+    params = dict(time_params(first), files=sorted(file_stats))
+
+    select_exprs = []
+    variant_conditions = []
+    for i, filters in enumerate(members):
+        condition, member_params = _where(filters, prefix=f"m{i}_")
+        params.update(member_params)
+        variant_conditions.append(condition)
+        select_exprs.append(f'COUNT(*) FILTER (WHERE {condition}) AS "__rows_{i}"')
+        for metric in filters.metrics or []:
+            if metric != "t_sampling_time":
+                select_exprs.append(f'AVG({metric}) FILTER (WHERE {condition}) AS "{metric}__{i}"')
+
+    # Rows that no member selects are dropped before aggregation
+    row_filter = "TRUE" if "TRUE" in variant_conditions else " OR ".join(f"({c})" for c in variant_conditions)
+
     sql = f"""
         SELECT * FROM (
-            SELECT {bucket_expr}, {select_exprs}
+            SELECT {_bucket_expr(_window_period(first), column_type=column_type)}, {", ".join(select_exprs)}
             FROM (
-                SELECT * FROM read_parquet('{query_path}')
-                WHERE {where_clause}
+                SELECT * FROM read_parquet($files, hive_partitioning = true)
+                WHERE {time_range(column_type)}
+                AND ({row_filter})
             )
             GROUP BY 1
         )
-        WHERE bucket_time BETWEEN '{filters.start_time}' AND '{filters.end_time}'
+        WHERE bucket_time BETWEEN $start AND $end
         ORDER BY bucket_time
     """
 
-    print(sql)
-    result = con.execute(sql).fetchdf()
+    logger.debug(sql)
+    with engine.cursor() as con, watch_query(first, sql, params, started, con=con, original=original,
+                                             rows_scanned=lambda: estimate_scan_rows(first, catalog)) as outcome:
+        with phase("scan"):
+            combined = con.execute(sql, params).fetchdf()
+        outcome["rows"] = len(combined)
+    RESULT_ROWS.observe(len(combined))
 
-    # Round numeric columns (skip bool)
-    for col in selected_metrics:
-        if col != "t_sampling_time" and col in result.columns:
-            if result[col].dtype in ['float64', 'float32', 'int64', 'int32']:
-                result[col] = result[col].round(2)
+    frames = []
+    with phase("postprocess"):
+        for i, filters in enumerate(members):
+            metrics = [m for m in filters.metrics or [] if m != "t_sampling_time"]
+            frame = combined[combined[f"__rows_{i}"] > 0][["bucket_time"] + [f"{m}__{i}" for m in metrics]]
+            frame = frame.rename(columns={f"{m}__{i}": m for m in metrics}).reset_index(drop=True)
+            frames.append(_round_metrics(frame, metrics))
+    return frames
 
-    con.close()
-    return result
+# ---------- Fleet queries ----------
+def _fleet_filters(fleet):
+    """QueryFilters covering every equipment=*/dcu=* leaf in the fleet query's range"""
+    return QueryFilters(year=None, month=None, equipment=fleet.equipment, day=None, dcu=None,
+                        start_time=fleet.start_time, end_time=fleet.end_time, metrics=[fleet.metric],
+                        window_period=None, where_args=fleet.where_args, conditions=fleet.conditions)
+
+def query_fleet(fleet, engine: Optional[DuckDBEngine] = None, catalog: Optional[ParquetCatalog] = None,
+                cache: Optional[QueryResultCache] = None) -> Dict[str, Any]:
+    """Aggregate one metric per equipment/dcu in a single scan and rank the DCUs.
+
+    Returns {"dcus": [...every DCU...], "ranking": [...top_n by aggregate...]}.
+    """
+    catalog = catalog or get_catalog()
+    filters = _fleet_filters(fleet)
+    return _cached(filters, catalog, cache, lambda: _run_fleet_query(fleet, filters, engine, catalog),
+                   kind="fleet", aggregate=fleet.aggregate, top_n=fleet.top_n, order=fleet.order)
+
+def _run_fleet_query(fleet, filters, engine: Optional[DuckDBEngine], catalog: ParquetCatalog) -> Dict[str, Any]:
+    with phase("resolve"):
+        file_stats = resolve_file_stats(filters, catalog)
+    if not file_stats:
+        return {"dcus": [], "ranking": []}
+
+    where_sql, params = _where(filters)
+    params.update(time_params(filters), files=[f.path for f in file_stats])
+    m = fleet.metric
+    column_type = time_type(file_stats)
+    # DuckDB splits the file list across its threads, so this is one parallel pass
+    sql = f"""
+        SELECT equipment, dcu,
+               round(AVG({m}), 2) AS avg, round(MIN({m}), 2) AS min, round(MAX({m}), 2) AS max,
+               round(arg_max({m}, {_time_expr("t_sampling_time", column_type)}), 2) AS last, COUNT({m}) AS samples
+        FROM read_parquet($files, hive_partitioning = true)
+        WHERE {time_range(column_type)} AND {where_sql}
+        GROUP BY equipment, dcu
+        ORDER BY equipment, dcu
+    """
+    logger.debug(sql)
+    engine = engine or get_engine()
+    with phase("scan"), engine.cursor() as con:
+        cur = con.execute(sql, params)
+        columns = [d[0] for d in cur.description]
+        dcus = [dict(zip(columns, row)) for row in cur.fetchall()]
+    RESULT_ROWS.observe(len(dcus))
+
+    ranked = [d for d in dcus if d[fleet.aggregate] is not None]
+    ranked.sort(key=lambda d: d[fleet.aggregate], reverse=fleet.order == "desc")
+    ranking = [dict(d, rank=i + 1) for i, d in enumerate(ranked[:fleet.top_n])]
+    return {"dcus": dcus, "ranking": ranking}
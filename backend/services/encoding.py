@@ -0,0 +1,111 @@
+# services/encoding.py
+import io
+import json
+from typing import Any, Dict, Iterator, List, Sequence
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the standard library encoder
+    orjson = None
+
+def _column_values(column: pa.ChunkedArray):
+    if orjson is not None and pa.types.is_floating(column.type):
+        return column.to_numpy()
+    return column.to_pylist()
+
+def columnar_payload(table: pa.Table, time_column: str = "bucket_time",
+                     group_by: Sequence[str] = ()) -> Dict[str, Any]:
+    """Shape an Arrow result as {timestamps: [...], series: {metric: [...]}}.
+
+    With orjson available, numeric columns stay numpy arrays and are encoded
+    without creating a Python object per cell. Grouped results become
+    {timestamps, groups: [{tags, series}]} instead.
+    """
+    if group_by:
+        return _grouped_payload(table, time_column, list(group_by))
+
+    series = {}
+    for name in table.column_names:
+        if name == time_column:
+            continue
+        series[name] = _column_values(table.column(name))
+
+    payload = {
+        "timestamps": table.column(time_column).to_pylist(),
+        "series": series
+    }
+    # Single-metric charts read data.values directly
+    if len(series) == 1:
+        payload["values"] = next(iter(series.values()))
+    return payload
+
+def _grouped_payload(table: pa.Table, time_column: str, group_by: List[str]) -> Dict[str, Any]:
+    """One series per tag combination, all aligned on the shared timestamp axis (gaps are null)"""
+    times = table.column(time_column)
+    timestamps = pc.unique(times).sort()
+    positions = pc.index_in(times, value_set=timestamps).to_numpy()
+    metrics = [name for name in table.column_names if name != time_column and name not in group_by]
+
+    groups = []
+    keys = table.select(group_by).group_by(group_by).aggregate([]).sort_by([(g, "ascending") for g in group_by])
+    for tags in keys.to_pylist():
+        mask = None
+        for column, value in tags.items():
+            match = pc.is_null(table.column(column)) if value is None else pc.equal(table.column(column), value)
+            mask = match if mask is None else pc.and_(mask, match)
+        mask = pc.fill_null(mask, False)
+        rows = table.filter(mask)
+        row_positions = positions[mask.to_numpy(zero_copy_only=False)]
+
+        series = {}
+        for name in metrics:
+            values = np.full(len(timestamps), np.nan)
+            values[row_positions] = rows.column(name).to_numpy().astype(float)
+            series[name] = values if orjson is not None else values.tolist()
+        groups.append({"tags": tags, "series": series})
+
+    return {"timestamps": timestamps.to_pylist(), "groups": groups}
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+def wants_arrow(accept_header: str) -> bool:
+    """Whether the client asked for an Arrow IPC stream"""
+    return ARROW_STREAM_MEDIA_TYPE in (accept_header or "")
+
+def _float32_schema(schema: pa.Schema) -> pa.Schema:
+    return pa.schema([
+        field.with_type(pa.float32()) if pa.types.is_float64(field.type) else field
+        for field in schema
+    ])
+
+def arrow_ipc_chunks(reader: pa.RecordBatchReader, float32: bool = False) -> Iterator[bytes]:
+    """Encode record batches as an Arrow IPC stream, yielding bytes as each batch is written"""
+    schema = _float32_schema(reader.schema) if float32 else reader.schema
+    buffer = io.BytesIO()
+    with pa.ipc.new_stream(buffer, schema) as writer:
+        for batch in reader:
+            writer.write_batch(batch.cast(schema) if float32 else batch)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    # End-of-stream marker written on close
+    yield buffer.getvalue()
+
+def dumps(content: Any) -> bytes:
+    """Encode a response body as JSON bytes (NaN becomes null)"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(_nan_to_none(content), default=str).encode("utf-8")
+
+def _nan_to_none(value: Any) -> Any:
+    if isinstance(value, float) and value != value:
+        return None
+    if isinstance(value, dict):
+        return {k: _nan_to_none(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_nan_to_none(v) for v in value]
+    return value
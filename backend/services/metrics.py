@@ -0,0 +1,160 @@
+# services/metrics.py
+"""Request phase timings and process-wide metrics.
+
+Code wraps its phases in `with phase("scan"):`. Each phase is added to
+the current request's RequestTimings (returned as a Server-Timing header)
+and observed in the phase_seconds histogram. render() writes every metric
+in the Prometheus text exposition format for the /metrics endpoint.
+"""
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+ROW_BUCKETS = (10, 100, 1e3, 1e4, 1e5, 1e6)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    """Monotonic count per label set"""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return self._header() + [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in sorted(values.items())]
+
+class Gauge(Counter):
+    """Value that goes up and down, e.g. requests in flight"""
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count per label set"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Labels, List] = {}
+
+    def observe(self, value: float, **labels):
+        key = _labels(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            snapshot = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        lines = self._header()
+        for key, (counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+# ---------- Application metrics ----------
+REQUESTS = Counter("http_requests_total", "HTTP requests by route, method and status")
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency by route")
+IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being handled")
+RESPONSE_BYTES = Histogram("http_response_size_bytes", "Response body size by route", SIZE_BUCKETS)
+PHASE_SECONDS = Histogram("request_phase_seconds", "Time spent per request phase")
+RESULT_ROWS = Histogram("query_result_rows", "Rows returned by DuckDB per query", ROW_BUCKETS)
+
+_METRICS = (REQUESTS, REQUEST_SECONDS, IN_FLIGHT, RESPONSE_BYTES, PHASE_SECONDS, RESULT_ROWS)
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format"""
+    return "\n".join(line for metric in _METRICS for line in metric.render()) + "\n"
+
+# ---------- Per-request phase timings ----------
+class RequestTimings:
+    """Phases of one request, in the order they finished"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases: List[Tuple[str, float]] = []
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self.phases.append((name, seconds))
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        """Server-Timing header value; repeated phases are summed"""
+        merged: Dict[str, float] = {}
+        with self._lock:
+            for name, seconds in self.phases:
+                merged[name] = merged.get(name, 0.0) + seconds
+        if total is not None:
+            merged["total"] = total
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in merged.items())
+
+current_timings: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar("current_timings", default=None)
+
+def record_phase(name: str, seconds: float):
+    """Add a measured phase to the current request and the phase histogram"""
+    PHASE_SECONDS.observe(seconds, phase=name)
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time the block as one phase of the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - started)
@@ -0,0 +1,399 @@
+# services/parquet_catalog.py
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+PARTITION_KEYS = ("year", "month", "day", "equipment", "dcu")
+
+# Written by services.compaction_service: which compacted files of a leaf are
+# live and which raw files they replaced
+COMPACTION_MARKER = "_compaction.json"
+COMPACTED_PREFIX = "compacted-"
+
+def normalize_time(value: Any) -> Optional[datetime]:
+    """Convert a timestamp statistic or query bound to a naive UTC datetime"""
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", errors="ignore")
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _partition_day(partition: Dict[str, str]) -> Optional[date]:
+    try:
+        return date(int(partition["year"]), int(partition["month"]), int(partition["day"]))
+    except (KeyError, ValueError):
+        return None
+
+def parse_partition(path: str, base_path: str) -> Dict[str, str]:
+    """Extract the hive key=value pairs of a file path below base_path"""
+    rel_path = os.path.relpath(os.path.dirname(path), base_path)
+    partition = {}
+    for part in rel_path.split(os.sep):
+        if "=" in part:
+            key, value = part.split("=", 1)
+            if key in PARTITION_KEYS:
+                partition[key] = value
+    return partition
+
+class ParquetFileStats:
+    """Footer statistics for a single parquet file"""
+
+    __slots__ = ("path", "mtime", "size", "partition", "row_count",
+                 "min_time", "max_time", "column_ranges", "time_type")
+
+    def __init__(self, path: str, mtime: float, size: int, partition: Dict[str, str],
+                 row_count: int, min_time: Optional[datetime], max_time: Optional[datetime],
+                 column_ranges: Dict[str, Tuple[Any, Any]], time_type: str = "TIMESTAMP"):
+        self.path = path
+        self.mtime = mtime
+        self.size = size
+        self.partition = partition
+        self.row_count = row_count
+        self.min_time = min_time
+        self.max_time = max_time
+        self.column_ranges = column_ranges
+        # DuckDB type of the time column: TIMESTAMPTZ when stored UTC-adjusted
+        self.time_type = time_type
+
+    def overlaps(self, start: Optional[datetime], end: Optional[datetime]) -> bool:
+        """Whether the file may hold rows inside [start, end]"""
+        if start and self.max_time and self.max_time < start:
+            return False
+        if end and self.min_time and self.min_time > end:
+            return False
+        return True
+
+    def may_match(self, predicates: Iterable[Tuple[str, str, Any]]) -> bool:
+        """Whether the file may hold rows satisfying every (column, op, value) predicate"""
+        for column, op, value in predicates:
+            bounds = self.column_ranges.get(column)
+            if not bounds:
+                continue
+            low, high = bounds
+            try:
+                if op == "=" and (value < low or value > high):
+                    return False
+                if op in ("<", "<=") and (low > value or (op == "<" and low == value)):
+                    return False
+                if op in (">", ">=") and (high < value or (op == ">" and high == value)):
+                    return False
+            except TypeError:
+                continue
+        return True
+
+def read_file_stats(path: str, base_path: str, time_column: str, stat_columns: Iterable[str]) -> ParquetFileStats:
+    """Read row count and column min/max from a parquet footer"""
+    st = os.stat(path)
+    parquet_file = pq.ParquetFile(path)
+    metadata = parquet_file.metadata
+    wanted = set(stat_columns) | {time_column}
+
+    indexes = {}
+    for i in range(metadata.num_columns):
+        name = metadata.schema.column(i).path
+        if name in wanted:
+            indexes[name] = i
+
+    ranges: Dict[str, Tuple[Any, Any]] = {}
+    for name, index in indexes.items():
+        low = high = None
+        complete = True
+        for rg in range(metadata.num_row_groups):
+            stats = metadata.row_group(rg).column(index).statistics
+            if stats is None or not stats.has_min_max:
+                complete = False
+                break
+            row_min, row_max = stats.min, stats.max
+            if name == time_column:
+                row_min, row_max = normalize_time(row_min), normalize_time(row_max)
+                if row_min is None or row_max is None:
+                    complete = False
+                    break
+            low = row_min if low is None or row_min < low else low
+            high = row_max if high is None or row_max > high else high
+        if complete and low is not None:
+            ranges[name] = (low, high)
+
+    min_time, max_time = ranges.pop(time_column, (None, None))
+    schema = parquet_file.schema_arrow
+    time_field = schema.field(time_column) if time_column in schema.names else None
+    if time_field is None or pa.types.is_timestamp(time_field.type):
+        time_type = "TIMESTAMPTZ" if getattr(time_field and time_field.type, "tz", None) else "TIMESTAMP"
+    else:
+        # Times written as text; queries cast them row by row
+        time_type = "VARCHAR"
+    return ParquetFileStats(
+        path=path,
+        mtime=st.st_mtime,
+        size=st.st_size,
+        partition=parse_partition(path, base_path),
+        row_count=metadata.num_rows,
+        min_time=min_time,
+        max_time=max_time,
+        column_ranges=ranges,
+        time_type=time_type
+    )
+
+def read_compaction_marker(leaf_dir: str) -> Dict[str, List[str]]:
+    """{"published": [...], "superseded": [...]} file names of a leaf; empty lists if none"""
+    try:
+        with open(os.path.join(leaf_dir, COMPACTION_MARKER)) as f:
+            marker = json.load(f)
+    except FileNotFoundError:
+        return {"published": [], "superseded": []}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Unreadable compaction marker in {leaf_dir}: {e}")
+        return {"published": [], "superseded": []}
+    return {"published": list(marker.get("published", [])), "superseded": list(marker.get("superseded", []))}
+
+def visible_parquet_names(leaf_dir: str, names: Iterable[str]) -> List[str]:
+    """Parquet files of a leaf that queries should read.
+
+    Compacted files only count once the marker publishes them, and the raw
+    files they replaced disappear at that same moment, so a reader sees
+    either the old set or the new one, never both.
+    """
+    names = list(names)
+    if COMPACTION_MARKER not in names:
+        return [n for n in names if n.endswith(".parquet") and not n.startswith(COMPACTED_PREFIX)]
+    marker = read_compaction_marker(leaf_dir)
+    published, superseded = set(marker["published"]), set(marker["superseded"])
+    return [n for n in names if n.endswith(".parquet") and n not in superseded
+            and (not n.startswith(COMPACTED_PREFIX) or n in published)]
+
+class ParquetCatalog:
+    """In-memory index of the parquet tree, keyed by leaf partition directory.
+
+    Leaves are re-listed at most once per refresh_interval; footers are only
+    re-read for files whose mtime or size changed since the last listing.
+    Queries find their leaves in the index (find_leaves); only refresh()
+    walks the tree for leaves that appeared or went away.
+    """
+
+    def __init__(self, base_path: str, time_column: str = "t_sampling_time",
+                 stat_columns: Iterable[str] = ("n_bank", "n_rack"), refresh_interval: float = 30.0):
+        self.base_path = base_path
+        self.time_column = time_column
+        self.stat_columns = tuple(stat_columns)
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._leaves: Dict[str, Dict[str, ParquetFileStats]] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._versions: Dict[str, int] = {}
+        # Partition keys of every indexed leaf, and the leaves of each day
+        self._partitions: Dict[str, Dict[str, str]] = {}
+        self._days: Dict[date, set] = {}
+        self._refresh_lock = threading.RLock()
+        self._indexed = threading.Event()
+
+    def _index(self, leaf_dir: str):
+        if leaf_dir in self._partitions:
+            return
+        partition = parse_partition(os.path.join(leaf_dir, ""), self.base_path)
+        self._partitions[leaf_dir] = partition
+        day = _partition_day(partition)
+        if day is not None:
+            self._days.setdefault(day, set()).add(leaf_dir)
+
+    def _unindex(self, leaf_dir: str):
+        partition = self._partitions.pop(leaf_dir, None)
+        day = _partition_day(partition) if partition is not None else None
+        if day is not None:
+            self._days.get(day, set()).discard(leaf_dir)
+            if not self._days.get(day):
+                self._days.pop(day, None)
+
+    def refresh_leaf(self, leaf_dir: str, force: bool = False) -> bool:
+        """Re-list one leaf directory; returns True if any file changed"""
+        now = time.monotonic()
+        if not force and now - self._checked_at.get(leaf_dir, float("-inf")) < self.refresh_interval:
+            return False
+
+        known = self._leaves.get(leaf_dir, {})
+        current: Dict[str, ParquetFileStats] = {}
+        changed = False
+        try:
+            entries = [e for e in os.scandir(leaf_dir) if e.is_file()]
+        except FileNotFoundError:
+            entries = []
+        visible = set(visible_parquet_names(leaf_dir, [e.name for e in entries]))
+        entries = [e for e in entries if e.name in visible]
+
+        for entry in entries:
+            st = entry.stat()
+            cached = known.get(entry.path)
+            if cached and cached.mtime == st.st_mtime and cached.size == st.st_size:
+                current[entry.path] = cached
+                continue
+            try:
+                current[entry.path] = read_file_stats(entry.path, self.base_path, self.time_column, self.stat_columns)
+                changed = True
+            except Exception as e:
+                logger.warning(f"Failed to read parquet footer {entry.path}: {e}")
+
+        if set(current) != set(known):
+            changed = True
+
+        with self._lock:
+            if current:
+                self._leaves[leaf_dir] = current
+                self._index(leaf_dir)
+            else:
+                self._leaves.pop(leaf_dir, None)
+                self._unindex(leaf_dir)
+            self._checked_at[leaf_dir] = now
+            if changed:
+                self._versions[leaf_dir] = self._versions.get(leaf_dir, 0) + 1
+        return changed
+
+    def refresh(self) -> int:
+        """Walk the whole tree and refresh every leaf; returns the number of changed leaves"""
+        with self._refresh_lock:
+            changed = 0
+            seen = set()
+            for root, dirs, files in os.walk(self.base_path):
+                # _-prefixed directories are work areas (e.g. compaction output), not partitions
+                dirs[:] = [d for d in dirs if not d.startswith("_")]
+                if any(f.endswith(".parquet") for f in files):
+                    seen.add(root)
+                    if self.refresh_leaf(root, force=True):
+                        changed += 1
+
+            with self._lock:
+                for leaf_dir in set(self._leaves) - seen:
+                    self._leaves.pop(leaf_dir, None)
+                    self._unindex(leaf_dir)
+                    self._checked_at.pop(leaf_dir, None)
+                    self._versions[leaf_dir] = self._versions.get(leaf_dir, 0) + 1
+                    changed += 1
+            self._indexed.set()
+
+        log = logger.info if changed else logger.debug
+        log(f"Parquet catalog refreshed: {len(self._leaves)} partitions, {changed} changed")
+        return changed
+
+    def refresh_every(self, interval: float, stop: threading.Event):
+        """refresh() now and every interval seconds until stop is set"""
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Parquet catalog refresh failed: {e}")
+            if stop.wait(interval):
+                return
+
+    def find_leaves(self, first_day: Optional[date] = None, last_day: Optional[date] = None,
+                    **keys: Any) -> List[str]:
+        """Indexed leaf directories of the days first_day..last_day whose partition keys match.
+
+        keys are partition values such as equipment="bsc" or dcu=1; None
+        matches anything. Nothing is read from disk, except that a lookup
+        before the first refresh() waits for (or runs) that walk.
+        """
+        if not self._indexed.is_set():
+            with self._refresh_lock:
+                if not self._indexed.is_set():
+                    self.refresh()
+        wanted = {key: str(value) for key, value in keys.items() if value is not None}
+        with self._lock:
+            if first_day is not None and last_day is not None:
+                candidates = [leaf_dir for n in range((last_day - first_day).days + 1)
+                              for leaf_dir in self._days.get(first_day + timedelta(days=n), ())]
+            else:
+                candidates = list(self._partitions)
+            return sorted(leaf_dir for leaf_dir in candidates
+                          if all(self._partitions[leaf_dir].get(key) == value for key, value in wanted.items()))
+
+    def leaf_dirs(self, patterns: Iterable[str]) -> List[str]:
+        """Expand leaf file globs into leaf directories; only wildcard directories hit the disk"""
+        dirs = []
+        for pattern in patterns:
+            leaf_dir = os.path.dirname(pattern)
+            if "*" in leaf_dir:
+                dirs.extend(d for d in glob.glob(leaf_dir) if os.path.isdir(d))
+            else:
+                dirs.append(leaf_dir)
+        return dirs
+
+    def partitions(self) -> List[str]:
+        """Every leaf directory currently indexed"""
+        with self._lock:
+            return sorted(self._leaves)
+
+    def leaf_files(self, leaf_dir: str) -> List[ParquetFileStats]:
+        """Statistics of every parquet file in one leaf partition"""
+        self.refresh_leaf(leaf_dir)
+        return sorted(self._leaves.get(leaf_dir, {}).values(), key=lambda s: s.path)
+
+    def versions(self, leaf_dirs: Iterable[str]) -> Dict[str, int]:
+        """Change counters of the given leaves, bumped whenever a file is added, modified or removed"""
+        result = {}
+        for leaf_dir in leaf_dirs:
+            self.refresh_leaf(leaf_dir)
+            result[leaf_dir] = self._versions.get(leaf_dir, 0)
+        return result
+
+    def files(self, patterns: Iterable[str], start: Any = None, end: Any = None,
+              predicates: Iterable[Tuple[str, str, Any]] = ()) -> List[ParquetFileStats]:
+        """Files under the given leaf globs that may match the time range and predicates"""
+        start, end = normalize_time(start), normalize_time(end)
+        predicates = list(predicates)
+
+        selected = []
+        for leaf_dir in self.leaf_dirs(patterns):
+            self.refresh_leaf(leaf_dir)
+            for stats in sorted(self._leaves.get(leaf_dir, {}).values(), key=lambda s: s.path):
+                if stats.overlaps(start, end) and stats.may_match(predicates):
+                    selected.append(stats)
+        return selected
+
+    def summary(self) -> Dict[str, Any]:
+        """Small status dict for diagnostics"""
+        with self._lock:
+            leaves = list(self._leaves.values())
+        return {
+            "base_path": self.base_path,
+            "partitions": len(leaves),
+            "files": sum(len(files) for files in leaves),
+            "rows": sum(s.row_count for files in leaves for s in files.values())
+        }
+
+
+# ---------- Application-wide catalog ----------
+_catalog: Optional[ParquetCatalog] = None
+_catalog_lock = threading.Lock()
+
+def init_catalog(**kwargs) -> ParquetCatalog:
+    """Create the shared catalog (called once at app startup)"""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = ParquetCatalog(**kwargs)
+        return _catalog
+
+def get_catalog() -> ParquetCatalog:
+    """Return the shared catalog, creating it with defaults if needed"""
+    if _catalog is None:
+        from config import BASE_PARQUET_PATH, CATALOG_REFRESH_SECONDS, CATALOG_STAT_COLUMNS
+        return init_catalog(base_path=BASE_PARQUET_PATH, refresh_interval=CATALOG_REFRESH_SECONDS,
+                            stat_columns=CATALOG_STAT_COLUMNS)
+    return _catalog
@@ -0,0 +1,128 @@
+# services/query_cache.py
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from services.parquet_catalog import normalize_time
+from services.query_filters import canonical_conditions
+
+logger = logging.getLogger(__name__)
+
+def _canonical_time(value: Optional[str]) -> Optional[str]:
+    parsed = normalize_time(value)
+    return parsed.isoformat() if parsed else value
+
+def canonical_filters(filters, **extra) -> str:
+    """Canonical, order-insensitive key for a QueryFilters request.
+
+    Extra keyword arguments (e.g. the response format) become part of the key.
+    """
+    data = filters.model_dump()
+    data["metrics"] = sorted(data.get("metrics") or [])
+    data["start_time"] = _canonical_time(data.get("start_time"))
+    data["end_time"] = _canonical_time(data.get("end_time"))
+    if data.get("window_period"):
+        data["window_period"] = " ".join(data["window_period"].lower().split())
+    # where_args and typed conditions meaning the same filter give the same key
+    data["where_args"] = canonical_conditions(filters)
+    data.pop("conditions", None)
+    data.update(extra)
+    return json.dumps(data, sort_keys=True, default=str)
+
+class QueryResultCache:
+    """LRU cache of query results bounded by an approximate byte budget.
+
+    Each entry remembers the catalog version of every partition it read;
+    a lookup whose current versions differ is treated as a miss and dropped.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _size_of(value: Any) -> int:
+        if isinstance(value, pd.DataFrame):
+            return int(value.memory_usage(deep=True).sum())
+        if hasattr(value, "nbytes"):
+            return int(value.nbytes)
+        return len(json.dumps(value, default=str))
+
+    @staticmethod
+    def _copy(value: Any) -> Any:
+        # Callers mutate DataFrames in place, never hand out the cached object
+        return value.copy() if isinstance(value, pd.DataFrame) else value
+
+    def get(self, key: str, signature: Dict[str, int]) -> Optional[Any]:
+        """Return the cached value if its partitions are unchanged"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, entry_signature, size = entry
+            if entry_signature != signature:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._copy(value)
+
+    def put(self, key: str, signature: Dict[str, int], value: Any):
+        """Store a value, evicting least recently used entries past the byte budget"""
+        size = self._size_of(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (self._copy(value), dict(signature), size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def invalidate(self, leaf_dir: Optional[str] = None) -> int:
+        """Drop every entry, or only those that read the given partition"""
+        with self._lock:
+            keys = [k for k, (_, signature, _) in self._entries.items()
+                    if leaf_dir is None or leaf_dir in signature]
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+# ---------- Application-wide cache ----------
+_cache: Optional[QueryResultCache] = None
+_cache_lock = threading.Lock()
+
+def get_query_cache() -> QueryResultCache:
+    """Return the shared result cache, creating it on first use"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from config import QUERY_CACHE_MAX_BYTES
+            _cache = QueryResultCache(max_bytes=QUERY_CACHE_MAX_BYTES)
+        return _cache
@@ -0,0 +1,280 @@
+# services/query_executor.py
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from services.duckdb_engine import QueryCancelledError, QueryToken, current_query_token
+from services.metrics import record_phase
+
+logger = logging.getLogger(__name__)
+
+# Priority classes: chart queries are interactive; schema syncs, auto-mapping,
+# connection sweeps and exports are background work
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# Chunks a streaming query may run ahead of the client before its worker blocks
+STREAM_QUEUE_CHUNKS = 4
+
+_STARTED = object()
+_FINISHED = object()
+
+class QueryTimeoutError(Exception):
+    """Raised when a query exceeds its time budget"""
+
+def _cancel_reason(error) -> str:
+    """QueryToken reason for why a call was cancelled"""
+    return "timeout" if isinstance(error, QueryTimeoutError) else "cancelled"
+
+class QueryExecutor:
+    """Runs blocking DuckDB work off the event loop on bounded thread pools.
+
+    Each priority class has its own pool, so its own queue and concurrency
+    cap: at most max_concurrency interactive queries and
+    background_concurrency background jobs execute at once. A queued
+    background job only starts while no interactive query is waiting or
+    running (or after waiting background_max_defer seconds, so it is never
+    starved). Each call gets a QueryToken, so a timeout or a client
+    disconnect interrupts the DuckDB statement instead of letting it finish.
+    """
+
+    def __init__(self, max_concurrency: int = 4, timeout: float = 60.0, poll_interval: float = 0.25,
+                 background_concurrency: int = 1, background_max_defer: float = 30.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.background_concurrency = max(1, background_concurrency)
+        self.background_max_defer = background_max_defer
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._pools = {
+            INTERACTIVE: ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="query"),
+            BACKGROUND: ThreadPoolExecutor(max_workers=self.background_concurrency, thread_name_prefix="background")
+        }
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = {INTERACTIVE: 0, BACKGROUND: 0}
+
+    def _submit(self, priority: str, token: QueryToken, fn: Callable[[], Any]):
+        if priority not in self._pools:
+            raise ValueError(f"Unknown priority class: {priority}")
+        with self._lock:
+            self._pending[priority] += 1
+        # Run in a copy of the caller's context so phase timings reach its request
+        context = contextvars.copy_context()
+        try:
+            future = self._pools[priority].submit(context.run, self._call, priority, token, fn, time.perf_counter())
+        except BaseException:
+            self._done(priority)
+            raise
+        # A call cancelled while still queued never reaches _call's cleanup
+        future.add_done_callback(lambda f: f.cancelled() and self._done(priority))
+        return future
+
+    def _done(self, priority: str):
+        with self._lock:
+            self._pending[priority] -= 1
+            if priority == INTERACTIVE and self._pending[INTERACTIVE] == 0:
+                self._idle.notify_all()
+
+    def _yield_to_interactive(self, token: QueryToken):
+        """Hold a background job back while interactive queries are queued or running"""
+        deadline = time.monotonic() + self.background_max_defer
+        with self._lock:
+            while self._pending[INTERACTIVE] > 0 and not token.cancelled:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.info("Starting background job despite interactive load")
+                    return
+                self._idle.wait(min(self.poll_interval, remaining))
+
+    def _call(self, priority: str, token: QueryToken, fn: Callable[[], Any], submitted: float) -> Any:
+        try:
+            if priority == BACKGROUND:
+                self._yield_to_interactive(token)
+            record_phase("queue", time.perf_counter() - submitted)
+            if token.cancelled:
+                raise QueryCancelledError("Query was cancelled before it started")
+            reset = current_query_token.set(token)
+            try:
+                return fn()
+            finally:
+                current_query_token.reset(reset)
+        finally:
+            self._done(priority)
+
+    async def run(self, fn: Callable, *args, request=None, timeout: Optional[float] = None,
+                  priority: str = INTERACTIVE, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) in its priority class and await its result.
+
+        If request is given, the query is cancelled once the HTTP client
+        disconnects.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        token = QueryToken()
+        future = asyncio.wrap_future(self._submit(priority, token, functools.partial(fn, *args, **kwargs)))
+        deadline = loop.time() + timeout
+
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise QueryTimeoutError(f"Query exceeded {timeout:g}s")
+                done, _ = await asyncio.wait({future}, timeout=min(self.poll_interval, remaining))
+                if done:
+                    return future.result()
+                if request is not None and await request.is_disconnected():
+                    raise QueryCancelledError("Client disconnected")
+        except (QueryTimeoutError, QueryCancelledError, asyncio.CancelledError) as e:
+            logger.info(f"Cancelling query: {e!r}")
+            token.cancel(_cancel_reason(e))
+            future.cancel()
+            raise
+
+    async def stream(self, open_chunks: Callable, *args, request=None, timeout: Optional[float] = None,
+                     priority: str = INTERACTIVE, **kwargs) -> AsyncIterator[bytes]:
+        """Run a streaming query and return its chunks as an async iterator.
+
+        open_chunks(*args, **kwargs) must return a context manager that yields
+        an iterator of bytes; it is entered and consumed on the worker thread,
+        so the concurrency slot, the pooled cursor and the cancel token stay
+        held until the stream ends. Errors raised while opening propagate from
+        this call; the timeout and client disconnects apply to the whole
+        stream and interrupt DuckDB between and during batches.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        token = QueryToken()
+        chunks: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_CHUNKS)
+
+        def put(item):
+            # Blocks while the client is behind; gives up once the stream is cancelled
+            pending = asyncio.run_coroutine_threadsafe(chunks.put(item), loop)
+            while True:
+                try:
+                    return pending.result(timeout=self.poll_interval)
+                except FutureTimeoutError:
+                    if token.cancelled:
+                        pending.cancel()
+                        raise QueryCancelledError("Stream was cancelled")
+
+        def produce():
+            with open_chunks(*args, **kwargs) as iterator:
+                put(_STARTED)
+                for chunk in iterator:
+                    if token.cancelled:
+                        raise QueryCancelledError("Stream was cancelled")
+                    put(chunk)
+            put(_FINISHED)
+
+        future = asyncio.wrap_future(self._submit(priority, token, produce))
+        deadline = loop.time() + timeout
+        getter = None
+
+        async def next_item():
+            nonlocal getter
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise QueryTimeoutError(f"Query exceeded {timeout:g}s")
+                # Keep one get() pending across polls so no chunk is lost to a cancelled getter
+                getter = getter or asyncio.ensure_future(chunks.get())
+                waiting = {getter} if future.done() else {getter, future}
+                done, _ = await asyncio.wait(waiting, timeout=min(self.poll_interval, remaining),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    item, getter = getter.result(), None
+                    return item
+                if future in done:
+                    # Raises the worker's error; a clean finish has already queued _FINISHED
+                    future.result()
+                if request is not None and await request.is_disconnected():
+                    raise QueryCancelledError("Client disconnected")
+
+        def cancel(reason):
+            logger.info(f"Cancelling query stream: {reason!r}")
+            token.cancel(_cancel_reason(reason))
+            future.cancel()
+            if getter is not None:
+                getter.cancel()
+
+        try:
+            first = await next_item()
+        except BaseException as e:
+            cancel(e)
+            raise
+
+        async def body():
+            item, ended = first, "stream ended early"
+            try:
+                while item is not _FINISHED:
+                    if item is not _STARTED:
+                        yield item
+                    item = await next_item()
+            except BaseException as e:
+                ended = e
+                raise
+            finally:
+                # Timed out, failed, or the client went away mid-stream
+                if item is not _FINISHED:
+                    cancel(ended)
+        return body()
+
+    def run_sync(self, fn: Callable, *args, priority: str = BACKGROUND, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Blocking variant of run() for sync route handlers; no timeout unless given"""
+        token = QueryToken()
+        future = self._submit(priority, token, functools.partial(fn, *args, **kwargs))
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            token.cancel("timeout")
+            future.cancel()
+            raise QueryTimeoutError(f"Job exceeded {timeout:g}s")
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Queued plus running calls and the cap of each priority class"""
+        with self._lock:
+            pending = dict(self._pending)
+        return {
+            INTERACTIVE: {"pending": pending[INTERACTIVE], "max_concurrency": self.max_concurrency},
+            BACKGROUND: {"pending": pending[BACKGROUND], "max_concurrency": self.background_concurrency}
+        }
+
+    def shutdown(self):
+        for pool in self._pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ---------- Application-wide executor ----------
+_executor: Optional[QueryExecutor] = None
+_executor_lock = threading.Lock()
+
+def init_executor(**kwargs) -> QueryExecutor:
+    """Create the shared executor (called once at app startup)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = QueryExecutor(**kwargs)
+        return _executor
+
+def get_executor() -> QueryExecutor:
+    """Return the shared executor, creating it with defaults if needed"""
+    if _executor is None:
+        from config import QUERY_MAX_CONCURRENCY, QUERY_TIMEOUT_SECONDS
+        from config import BACKGROUND_MAX_CONCURRENCY, BACKGROUND_MAX_DEFER_SECONDS
+        return init_executor(max_concurrency=QUERY_MAX_CONCURRENCY, timeout=QUERY_TIMEOUT_SECONDS,
+                             background_concurrency=BACKGROUND_MAX_CONCURRENCY,
+                             background_max_defer=BACKGROUND_MAX_DEFER_SECONDS)
+    return _executor
+
+def shutdown_executor():
+    """Stop the shared executor (called at app shutdown)"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
@@ -0,0 +1,152 @@
+# services/query_filters.py
+"""Typed query filters compiled into parameterized DuckDB SQL.
+
+Filters come from three places: QueryFilters.conditions, legacy
+where_args strings that parse as a plain comparison, and the
+EquipmentFilter rows of QueryFilters.equipment_id. All of them end up as
+FilterCondition objects; only where_args that don't parse are still
+pasted into the SQL as-is.
+"""
+import json
+import logging
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from models.filters import FilterCondition
+import services.meta_crud as meta_crud
+
+logger = logging.getLogger(__name__)
+
+_WHERE_ARG = re.compile(r"^\s*(\w+)\s*(<=|>=|!=|<>|=|<|>)\s*(.+?)\s*$")
+_NUMBER = re.compile(r"^-?\d+(\.\d+)?$")
+
+def parse_literal(text: str) -> Optional[Any]:
+    """A quoted string or a number; None for anything else (e.g. a column name).
+
+    A quoted string must be one literal: doubled quotes inside it are
+    unescaped ('it''s'), a lone inner quote ('x' OR name = 'y') means the
+    text is more than a literal and is left to the raw SQL path.
+    """
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "'\"":
+        quote, inner = text[0], text[1:-1]
+        if quote in inner.replace(quote * 2, ""):
+            return None
+        return inner.replace(quote * 2, quote)
+    if _NUMBER.match(text):
+        return float(text) if "." in text else int(text)
+    return None
+
+def parse_where_arg(arg: str) -> Optional[FilterCondition]:
+    """Turn a legacy 'n_bank = 1' fragment into a condition, if it is that simple"""
+    match = _WHERE_ARG.match(arg)
+    if not match:
+        return None
+    column, op, literal = match.groups()
+    value = parse_literal(literal)
+    if value is None:
+        return None
+    return FilterCondition(column=column, op="!=" if op == "<>" else op, value=value)
+
+def split_conditions(filters) -> Tuple[List[FilterCondition], List[str]]:
+    """(typed conditions, where_args that could not be parsed) of a request"""
+    conditions = list(getattr(filters, "conditions", None) or [])
+    raw = []
+    for arg in filters.where_args or []:
+        condition = parse_where_arg(arg)
+        if condition is None:
+            raw.append(arg)
+        else:
+            conditions.append(condition)
+    return conditions, raw
+
+def _operands(condition: FilterCondition) -> list:
+    return list(condition.values) if condition.op in ("in", "not_in", "between") else [condition.value]
+
+def condition_shape(conditions: Iterable[FilterCondition]) -> Tuple:
+    """Columns, operators and operand counts; conditions of the same shape share one SQL template"""
+    return tuple((c.column, c.op, len(_operands(c))) for c in conditions)
+
+@lru_cache(maxsize=512)
+def _where_template(shape: Tuple, raw: Tuple[str, ...], prefix: str) -> str:
+    clauses = []
+    index = 0
+    for column, op, count in shape:
+        names = [f"${prefix}{index + i}" for i in range(count)]
+        index += count
+        if op == "in":
+            clauses.append(f"{column} IN ({', '.join(names)})")
+        elif op == "not_in":
+            clauses.append(f"{column} NOT IN ({', '.join(names)})")
+        elif op == "between":
+            clauses.append(f"{column} BETWEEN {names[0]} AND {names[1]}")
+        else:
+            clauses.append(f"{column} {op} {names[0]}")
+    clauses.extend(f"({arg})" for arg in raw)
+    return " AND ".join(clauses) or "TRUE"
+
+def compile_conditions(conditions: List[FilterCondition], raw: Iterable[str] = (),
+                       prefix: str = "p") -> Tuple[str, Dict[str, Any]]:
+    """(WHERE fragment, named parameters) for the conditions, AND-ed together"""
+    sql = _where_template(condition_shape(conditions), tuple(raw), prefix)
+    operands = [value for c in conditions for value in _operands(c)]
+    return sql, {f"{prefix}{i}": value for i, value in enumerate(operands)}
+
+def pruning_predicates(conditions: Iterable[FilterCondition]) -> List[tuple]:
+    """(column, op, value) bounds usable against parquet min/max statistics"""
+    predicates = []
+    for c in conditions:
+        values = _operands(c)
+        if not all(isinstance(v, (int, float)) for v in values):
+            continue
+        if c.op in ("=", "<", "<=", ">", ">="):
+            predicates.append((c.column, c.op, c.value))
+        elif c.op in ("in", "between"):
+            predicates.append((c.column, ">=", min(values)))
+            predicates.append((c.column, "<=", max(values)))
+    return predicates
+
+def canonical_conditions(filters) -> list:
+    """Order-insensitive form of every filter of a request, for cache keys"""
+    conditions, raw = split_conditions(filters)
+    canonical = [[c.column.lower(), c.op, sorted(_operands(c), key=json.dumps) if c.op in ("in", "not_in")
+                  else _operands(c)] for c in conditions]
+    canonical += [["raw", " ".join(arg.split())] for arg in raw]
+    return sorted(canonical, key=json.dumps)
+
+# ---------- EquipmentFilter rows ----------
+def equipment_conditions(db, eqp_id: int) -> List[FilterCondition]:
+    """Conditions from an equipment's EquipmentFilter rows; repeated keys become IN lists"""
+    grouped: Dict[str, list] = {}
+    for row in meta_crud.get_by_eq_id(db, eqp_id):
+        value = parse_literal(row.filter_value)
+        grouped.setdefault(row.filter_key, []).append(row.filter_value if value is None else value)
+
+    conditions = []
+    for column, values in grouped.items():
+        try:
+            if len(values) == 1:
+                conditions.append(FilterCondition(column=column, op="=", value=values[0]))
+            else:
+                conditions.append(FilterCondition(column=column, op="in", values=values))
+        except ValueError as e:
+            logger.warning(f"Skipping EquipmentFilter {column!r} of equipment {eqp_id}: {e}")
+    return conditions
+
+def with_equipment_conditions(filters, db=None):
+    """Fold the EquipmentFilter rows of filters.equipment_id into filters.conditions"""
+    eqp_id = getattr(filters, "equipment_id", None)
+    if not eqp_id:
+        return filters
+
+    close = db is None
+    if db is None:
+        from config import SessionLocal
+        db = SessionLocal()
+    try:
+        extra = equipment_conditions(db, eqp_id)
+    finally:
+        if close:
+            db.close()
+    return filters.model_copy(update={"conditions": list(filters.conditions or []) + extra, "equipment_id": None})
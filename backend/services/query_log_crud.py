@@ -0,0 +1,95 @@
+# backend/services/query_log_crud.py
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models.query_log_models import SlowQuery
+from datetime import datetime, timedelta
+import json
+import logging
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# ---------- SlowQuery CRUD ----------
+def create_slow_query(db: Session, **fields) -> SlowQuery:
+    """Store one slow query record"""
+    try:
+        record = SlowQuery(**fields)
+        db.add(record)
+        db.commit()
+        db.refresh(record)
+        return record
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to store slow query: {str(e)}")
+        raise Exception(f"Failed to store slow query: {str(e)}")
+
+def get_recent_slow_queries(db: Session, limit: int = 50) -> List[SlowQuery]:
+    """Most recent slow queries first"""
+    try:
+        return db.query(SlowQuery).order_by(SlowQuery.created_at.desc()).limit(limit).all()
+    except Exception as e:
+        logger.error(f"Failed to get slow queries: {str(e)}")
+        return []
+
+def get_slow_queries_by_fingerprint(db: Session, fingerprint: str, limit: int = 50) -> List[SlowQuery]:
+    """Recent executions of one query pattern"""
+    try:
+        return (db.query(SlowQuery).filter(SlowQuery.fingerprint == fingerprint)
+                .order_by(SlowQuery.created_at.desc()).limit(limit).all())
+    except Exception as e:
+        logger.error(f"Failed to get slow queries for {fingerprint}: {str(e)}")
+        return []
+
+TOP_ORDERINGS = ("total_ms", "count", "avg_ms", "max_ms")
+
+def get_top_fingerprints(db: Session, limit: int = 10, order_by: str = "total_ms",
+                         since_hours: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Slow query patterns aggregated by fingerprint, costliest first"""
+    if order_by not in TOP_ORDERINGS:
+        raise ValueError(f"order_by must be one of {sorted(TOP_ORDERINGS)}")
+    try:
+        count = func.count(SlowQuery.query_id).label("count")
+        total = func.sum(SlowQuery.duration_ms).label("total_ms")
+        avg = func.avg(SlowQuery.duration_ms).label("avg_ms")
+        worst = func.max(SlowQuery.duration_ms).label("max_ms")
+        query = db.query(
+            SlowQuery.fingerprint,
+            func.max(SlowQuery.fingerprint_data).label("fingerprint_data"),
+            count, total, avg, worst,
+            func.avg(SlowQuery.files_touched).label("avg_files"),
+            func.avg(SlowQuery.rows_scanned).label("avg_rows_scanned"),
+            func.max(SlowQuery.created_at).label("last_seen")
+        )
+        if since_hours:
+            query = query.filter(SlowQuery.created_at >= datetime.utcnow() - timedelta(hours=since_hours))
+        ordering = {"total_ms": total, "count": count, "avg_ms": avg, "max_ms": worst}[order_by]
+        rows = query.group_by(SlowQuery.fingerprint).order_by(ordering.desc()).limit(limit).all()
+        return [{
+            "fingerprint": row.fingerprint,
+            "pattern": json.loads(row.fingerprint_data),
+            "count": row.count,
+            "total_ms": round(row.total_ms, 1),
+            "avg_ms": round(row.avg_ms, 1),
+            "max_ms": round(row.max_ms, 1),
+            "avg_files": round(row.avg_files or 0, 1),
+            "avg_rows_scanned": int(row.avg_rows_scanned or 0),
+            "last_seen": row.last_seen.isoformat() if row.last_seen else None
+        } for row in rows]
+    except Exception as e:
+        logger.error(f"Failed to aggregate slow queries: {str(e)}")
+        return []
+
+def delete_slow_queries(db: Session, older_than_days: Optional[int] = None) -> int:
+    """Delete slow query records (all, or those older than the given age)"""
+    try:
+        query = db.query(SlowQuery)
+        if older_than_days is not None:
+            query = query.filter(SlowQuery.created_at < datetime.utcnow() - timedelta(days=older_than_days))
+        count = query.delete(synchronize_session=False)
+        db.commit()
+        logger.info(f"Deleted {count} slow query records")
+        return count
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to delete slow queries: {str(e)}")
+        return 0
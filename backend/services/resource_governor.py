@@ -0,0 +1,83 @@
+# services/resource_governor.py
+"""DuckDB threads, memory and spill settings sized for the host.
+
+threads and memory_limit apply to the whole DuckDB database, so every
+concurrent query of a worker process shares them. With several uvicorn
+workers each process runs its own database; the host's cores and memory
+are split evenly between them so the workers together never ask for more
+than the machine has.
+"""
+import logging
+import re
+from typing import Any, Dict, Optional
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# DuckDB options the governor manages, in the order they are applied
+GOVERNED_SETTINGS = ("threads", "memory_limit", "temp_directory", "max_temp_directory_size")
+
+_SIZE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?i?B)\s*$", re.IGNORECASE)
+_SIZE_UNITS = {"B": 1, "KB": 1000, "MB": 1000 ** 2, "GB": 1000 ** 3, "TB": 1000 ** 4,
+               "KIB": 1024, "MIB": 1024 ** 2, "GIB": 1024 ** 3, "TIB": 1024 ** 4}
+
+def parse_size(value: str) -> Optional[int]:
+    """Bytes of a DuckDB size string such as '4GB' or '12.5 GiB'; None if it isn't one"""
+    match = _SIZE.match(value or "")
+    if not match:
+        return None
+    number, unit = match.groups()
+    return int(float(number) * _SIZE_UNITS[unit.upper()])
+
+def host_resources() -> Dict[str, int]:
+    """Logical cores and total memory of the machine"""
+    return {"cores": psutil.cpu_count(logical=True) or 1, "memory_bytes": psutil.virtual_memory().total}
+
+def plan_settings(workers: int = 1, threads: Optional[int] = None, memory_limit: Optional[str] = None,
+                  memory_fraction: float = 0.75, temp_directory: Optional[str] = None,
+                  max_temp_directory_size: Optional[str] = None) -> Dict[str, Any]:
+    """DuckDB settings for one of `workers` processes; explicit values win over host sizing"""
+    workers = max(1, workers)
+    host = host_resources()
+    if threads is None:
+        threads = max(1, host["cores"] // workers)
+    if memory_limit is None:
+        mb = int(host["memory_bytes"] * memory_fraction / workers) // (1000 ** 2)
+        memory_limit = f"{max(mb, 256)}MB"
+
+    settings = {"threads": threads, "memory_limit": memory_limit}
+    if temp_directory:
+        settings["temp_directory"] = temp_directory
+    if max_temp_directory_size:
+        settings["max_temp_directory_size"] = max_temp_directory_size
+    logger.info(f"DuckDB resources for 1 of {workers} worker(s) on {host['cores']} cores: {settings}")
+    return settings
+
+def configured_settings() -> Dict[str, Any]:
+    """plan_settings() for the values in config.py"""
+    from config import UVICORN_WORKERS, DUCKDB_THREADS, DUCKDB_MEMORY_LIMIT, DUCKDB_MEMORY_FRACTION
+    from config import DUCKDB_TEMP_DIRECTORY, DUCKDB_MAX_TEMP_DIRECTORY_SIZE
+    return plan_settings(UVICORN_WORKERS, DUCKDB_THREADS, DUCKDB_MEMORY_LIMIT, DUCKDB_MEMORY_FRACTION,
+                         DUCKDB_TEMP_DIRECTORY, DUCKDB_MAX_TEMP_DIRECTORY_SIZE)
+
+def validate_settings(settings: Dict[str, Any]) -> Dict[str, Any]:
+    """Reject unknown options and malformed values before they reach SET"""
+    clean = {}
+    for name, value in settings.items():
+        if name not in GOVERNED_SETTINGS:
+            raise ValueError(f"Unsupported DuckDB setting: {name}")
+        if name == "threads":
+            if int(value) < 1:
+                raise ValueError("threads must be at least 1")
+            value = int(value)
+        elif name in ("memory_limit", "max_temp_directory_size") and parse_size(str(value)) is None:
+            raise ValueError(f"{name} must be a size such as '4GB', got {value!r}")
+        clean[name] = value
+    return clean
+
+def set_statement(name: str, value: Any) -> str:
+    """SET statement for a validated setting (SET takes no bound parameters)"""
+    if isinstance(value, int):
+        return f"SET {name} = {value}"
+    return "SET {} = '{}'".format(name, str(value).replace("'", "''"))
@@ -0,0 +1,201 @@
+# services/rollup_service.py
+"""Multi-resolution rollups of the raw parquet tree.
+
+Each raw leaf partition (year/month/day/equipment/dcu) gets one rollup file
+per resolution, stored in a parallel hive tree:
+
+    <ROLLUP_PARQUET_PATH>/resolution=1h/year=2025/month=03/day=02/equipment=bsc/dcu=2/rollup.parquet
+
+Rows are keyed by bucket_time plus the tag columns and hold, per numeric
+metric, the mergeable aggregates <metric>__min/__max/__sum/__count/__first/__last.
+
+Run `python -m services.rollup_service` from the backend directory (e.g. from
+a scheduled task) to build or refresh them; only stale leaves are rewritten.
+Queries also build the rollup of a finished day lazily (ensure_leaf_rollup)
+the first time they would otherwise scan its raw files.
+"""
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import pyarrow.parquet as pq
+
+from services.duckdb_engine import DuckDBEngine, get_engine
+from services.parquet_catalog import ParquetCatalog, get_catalog
+from services.single_flight import get_single_flight
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_FILE = "rollup.parquet"
+NUMERIC_TYPES = ("TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "UTINYINT", "USMALLINT",
+                 "UINTEGER", "UBIGINT", "FLOAT", "DOUBLE", "DECIMAL", "REAL")
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+def rollup_leaf_path(rollup_path: str, base_path: str, leaf_dir: str, resolution: str) -> str:
+    """Location of the rollup file that mirrors a raw leaf partition"""
+    rel_path = os.path.relpath(leaf_dir, base_path)
+    return os.path.join(rollup_path, f"resolution={resolution}", rel_path, ROLLUP_FILE)
+
+def is_fresh(rollup_file: str, raw_mtimes: List[float]) -> bool:
+    """A rollup is fresh when it was written after every raw file of its leaf"""
+    try:
+        return os.path.getmtime(rollup_file) >= max(raw_mtimes, default=0)
+    except OSError:
+        return False
+
+def choose_rollup(window_seconds: Optional[float], start_seconds_of_day: float,
+                  resolutions: Dict[str, int]) -> Optional[Tuple[str, int]]:
+    """Coarsest resolution whose buckets nest exactly inside the query buckets"""
+    if not window_seconds or not resolutions:
+        return None
+    for name, seconds in sorted(resolutions.items(), key=lambda item: item[1], reverse=True):
+        if 86400 % seconds:
+            continue
+        if window_seconds % seconds == 0 and start_seconds_of_day % seconds == 0:
+            return name, seconds
+    return None
+
+_metadata_cache: Dict[str, Tuple[float, List[str], int]] = {}
+_metadata_lock = threading.Lock()
+
+def _rollup_metadata(rollup_file: str) -> Tuple[List[str], int]:
+    """Column names and row count of a rollup file (cached by mtime)"""
+    mtime = os.path.getmtime(rollup_file)
+    with _metadata_lock:
+        cached = _metadata_cache.get(rollup_file)
+        if cached and cached[0] == mtime:
+            return cached[1], cached[2]
+    metadata = pq.read_metadata(rollup_file)
+    columns, rows = metadata.schema.names, metadata.num_rows
+    with _metadata_lock:
+        _metadata_cache[rollup_file] = (mtime, columns, rows)
+    return columns, rows
+
+def rollup_columns(rollup_file: str) -> List[str]:
+    """Column names of a rollup file"""
+    return _rollup_metadata(rollup_file)[0]
+
+def rollup_row_count(rollup_file: str) -> int:
+    """Row count of a rollup file, from its footer"""
+    return _rollup_metadata(rollup_file)[1]
+
+def _metric_columns(con, files_sql: str, time_column: str, tag_columns: List[str]) -> Tuple[List[str], List[str]]:
+    """Split a leaf's columns into (numeric metrics, tag columns present)"""
+    described = con.execute(f"DESCRIBE SELECT * FROM read_parquet({files_sql}, hive_partitioning = false)").fetchall()
+    names = [row[0] for row in described]
+    tags = [t for t in tag_columns if t in names]
+    metrics = [row[0] for row in described
+               if row[0] != time_column and row[0] not in tags
+               and row[1].upper().startswith(NUMERIC_TYPES)]
+    return metrics, tags
+
+def build_leaf_rollup(engine: DuckDBEngine, files: List[str], out_file: str, seconds: int,
+                      tag_columns: List[str], time_column: str = "t_sampling_time") -> int:
+    """Aggregate one raw leaf into a rollup file; returns the number of rollup rows"""
+    files_sql = "[" + ", ".join(_quote(f) for f in files) + "]"
+    tmp_file = out_file + ".tmp"
+    os.makedirs(os.path.dirname(out_file), exist_ok=True)
+
+    with engine.cursor() as con:
+        metrics, tags = _metric_columns(con, files_sql, time_column, tag_columns)
+        aggregates = []
+        for m in metrics:
+            aggregates += [
+                f'MIN({m}) AS "{m}__min"',
+                f'MAX({m}) AS "{m}__max"',
+                f'SUM({m}) AS "{m}__sum"',
+                f'COUNT({m}) AS "{m}__count"',
+                f'arg_min({m}, {time_column}) AS "{m}__first"',
+                f'arg_max({m}, {time_column}) AS "{m}__last"',
+            ]
+        group_columns = ", ".join(["bucket_time"] + tags)
+        select_tags = "".join(f", {t}" for t in tags)
+        sql = f"""
+            COPY (
+                SELECT time_bucket(INTERVAL '{seconds} seconds', CAST({time_column} AS TIMESTAMP)) AS bucket_time{select_tags},
+                       {", ".join(aggregates)}
+                FROM read_parquet({files_sql}, hive_partitioning = false)
+                GROUP BY {group_columns}
+                ORDER BY {group_columns}
+            ) TO {_quote(tmp_file)} (FORMAT parquet, COMPRESSION zstd)
+        """
+        con.execute(sql)
+        rows = con.execute(f"SELECT COUNT(*) FROM read_parquet({_quote(tmp_file)})").fetchone()[0]
+
+    # Swap the finished file in so readers never see a partial rollup
+    os.replace(tmp_file, out_file)
+    return rows
+
+def ensure_leaf_rollup(leaf_dir: str, resolution: str, seconds: int, rollup_path: str, tag_columns: List[str],
+                       catalog: Optional[ParquetCatalog] = None, engine: Optional[DuckDBEngine] = None) -> Optional[str]:
+    """Rollup file of a leaf, building it first when missing or stale; None if that fails.
+
+    Concurrent queries needing the same rollup wait for a single build.
+    """
+    catalog = catalog or get_catalog()
+    raw_files = catalog.leaf_files(leaf_dir)
+    if not raw_files:
+        return None
+    out_file = rollup_leaf_path(rollup_path, catalog.base_path, leaf_dir, resolution)
+    if is_fresh(out_file, [f.mtime for f in raw_files]):
+        return out_file
+
+    def build():
+        # Another query may have finished the build while this one waited
+        if not is_fresh(out_file, [f.mtime for f in raw_files]):
+            rows = build_leaf_rollup(engine or get_engine(), [f.path for f in raw_files], out_file,
+                                     seconds, tag_columns, catalog.time_column)
+            logger.info(f"Built {resolution} rollup for {leaf_dir} on demand ({rows} rows)")
+        return out_file
+
+    try:
+        return get_single_flight().do(f"rollup:{out_file}", build)
+    except Exception as e:
+        logger.error(f"Failed to build {resolution} rollup for {leaf_dir}: {e}")
+        return None
+
+def build_rollups(rollup_path: str, resolutions: Dict[str, int], tag_columns: List[str],
+                  catalog: Optional[ParquetCatalog] = None, engine: Optional[DuckDBEngine] = None,
+                  force: bool = False) -> Dict[str, int]:
+    """Build or refresh every stale rollup file under rollup_path"""
+    catalog = catalog or get_catalog()
+    engine = engine or get_engine()
+    catalog.refresh()
+
+    result = {"built": 0, "skipped": 0, "failed": 0}
+    for leaf_dir in catalog.partitions():
+        raw_files = catalog.leaf_files(leaf_dir)
+        if not raw_files:
+            continue
+        raw_mtimes = [f.mtime for f in raw_files]
+        for name, seconds in resolutions.items():
+            out_file = rollup_leaf_path(rollup_path, catalog.base_path, leaf_dir, name)
+            if not force and is_fresh(out_file, raw_mtimes):
+                result["skipped"] += 1
+                continue
+            try:
+                rows = build_leaf_rollup(engine, [f.path for f in raw_files], out_file, seconds,
+                                         tag_columns, catalog.time_column)
+                result["built"] += 1
+                logger.info(f"Built {name} rollup for {leaf_dir} ({rows} rows)")
+            except Exception as e:
+                result["failed"] += 1
+                logger.error(f"Failed to build {name} rollup for {leaf_dir}: {e}")
+
+    logger.info(f"Rollup build finished: {result}")
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import ROLLUP_PARQUET_PATH, ROLLUP_RESOLUTIONS, ROLLUP_TAG_COLUMNS
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build multi-resolution rollups of the parquet tree")
+    parser.add_argument("--force", action="store_true", help="Rebuild every rollup, even fresh ones")
+    args = parser.parse_args()
+
+    build_rollups(ROLLUP_PARQUET_PATH, ROLLUP_RESOLUTIONS, ROLLUP_TAG_COLUMNS, force=args.force)
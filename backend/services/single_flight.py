@@ -0,0 +1,114 @@
+# services/single_flight.py
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from services.duckdb_engine import QueryCancelledError
+
+logger = logging.getLogger(__name__)
+
+class _Flight:
+    """One in-flight asyncio call and the number of requests waiting on it"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """Coalesces identical concurrent calls so only one of them does the work.
+
+    The first caller for a key runs the call; callers arriving while it is
+    still running wait for and share its result (or exception). Nothing is
+    kept once the call finishes; the result cache handles later repeats.
+    """
+
+    def __init__(self, poll_interval: float = 0.25):
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self._flights: Dict[str, _Flight] = {}
+        self.shared = 0
+
+    def do(self, key: str, fn: Callable, *args, **kwargs) -> Any:
+        """Blocking variant for sync code running on worker threads"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+            else:
+                self.shared += 1
+
+        if not leader:
+            logger.debug(f"Joining in-flight call {key}")
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def do_async(self, key: str, factory: Callable[[], Awaitable[Any]], request=None) -> Any:
+        """Await the shared call for key, starting factory() if none is running.
+
+        The shared call is cancelled only once every waiting request has
+        gone away, so one client disconnecting doesn't fail the others.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            with self._lock:
+                self.shared += 1
+            logger.debug(f"Joining in-flight query {key}")
+
+        flight.waiters += 1
+        try:
+            while True:
+                done, _ = await asyncio.wait({flight.task}, timeout=self.poll_interval)
+                if done:
+                    return flight.task.result()
+                if request is not None and await request.is_disconnected():
+                    raise QueryCancelledError("Client disconnected")
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls) + len(self._flights),
+                "shared": self.shared
+            }
+
+
+# ---------- Application-wide coalescer ----------
+_single_flight: Optional[SingleFlight] = None
+_single_flight_lock = threading.Lock()
+
+def get_single_flight() -> SingleFlight:
+    """Return the shared coalescer, creating it on first use"""
+    global _single_flight
+    with _single_flight_lock:
+        if _single_flight is None:
+            _single_flight = SingleFlight()
+        return _single_flight
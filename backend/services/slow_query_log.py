@@ -0,0 +1,150 @@
+# services/slow_query_log.py
+"""Slow-query log.
+
+Queries slower than SLOW_QUERY_THRESHOLD_MS are stored in the slow_queries
+table with a fingerprint that ignores the concrete time range and filter
+values, so repeated dashboard patterns aggregate into one row of
+/admin/slow-queries/top. Queries that time out, are cancelled or fail are
+logged too once they ran past the threshold, with their status.
+"""
+import hashlib
+import json
+import logging
+import re
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import duckdb
+
+from config import SLOW_QUERY_THRESHOLD_MS, SLOW_QUERY_EXPLAIN, SLOW_QUERY_MAX_FILES_LOGGED
+from services.duckdb_engine import QueryCancelledError, current_query_token
+from services.metrics import current_timings
+from services.parquet_catalog import normalize_time
+from services.query_filters import condition_shape, split_conditions
+
+logger = logging.getLogger(__name__)
+
+_LITERAL = re.compile(r"'[^']*'|\b\d+(\.\d+)?\b")
+
+def _range_class(seconds: float) -> str:
+    """Coarse range length, so 23h59m and 24h fingerprint alike"""
+    for limit, label in ((3600, "<=1h"), (6 * 3600, "<=6h"), (86400, "<=1d"), (7 * 86400, "<=7d"),
+                         (31 * 86400, "<=31d"), (366 * 86400, "<=1y")):
+        if seconds <= limit + 60:
+            return label
+    return ">1y"
+
+def fingerprint_data(filters, original=None) -> Dict[str, Any]:
+    """Normalized shape of a request: what it asks for, not which values.
+
+    original is the request as the client sent it; range and tail come from
+    it, since the executed filters of a `since` request cover only its tail.
+    """
+    original = original or filters
+    conditions, raw = split_conditions(filters)
+    try:
+        span = (normalize_time(original.end_time) - normalize_time(original.start_time)).total_seconds()
+        range_class = _range_class(span)
+    except Exception:
+        range_class = None
+    return {
+        "metrics": sorted(filters.metrics or ["*"]),
+        "equipment": filters.equipment,
+        "dcu": filters.dcu,
+        "window": filters.window_period,
+        "aggregation": getattr(filters, "aggregation", None) or "avg",
+        "group_by": list(getattr(filters, "group_by", None) or []),
+        "range": range_class,
+        "tail": bool(getattr(original, "since", None)),
+        "filters": [list(shape) for shape in sorted(condition_shape(conditions))]
+                   + [_LITERAL.sub("?", " ".join(arg.split())) for arg in raw]
+    }
+
+def fingerprint(data: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def _explain_analyze(con, sql: str, params: Dict[str, Any]) -> Optional[str]:
+    """Re-run the statement under EXPLAIN ANALYZE and return DuckDB's profile"""
+    try:
+        rows = con.execute(f"EXPLAIN ANALYZE {sql}", params).fetchall()
+        return "\n".join(str(row[-1]) for row in rows)
+    except Exception as e:
+        logger.warning(f"EXPLAIN ANALYZE failed: {e}")
+        return None
+
+def log_if_slow(filters, elapsed: float, sql: str, params: Dict[str, Any], result_rows: Optional[int],
+                rows_scanned: Optional[Callable[[], int]] = None, con=None, original=None, status: str = "ok"):
+    """Store the execution when it took longer than the threshold; never raises.
+
+    rows_scanned is only called for slow queries; con, the cursor that ran
+    the query, is needed for the EXPLAIN ANALYZE capture; original is the
+    request before _prepare rewrote it (see fingerprint_data). status is
+    ok, timeout, cancelled or error.
+    """
+    duration_ms = elapsed * 1000
+    if duration_ms < SLOW_QUERY_THRESHOLD_MS:
+        return
+    try:
+        data = fingerprint_data(filters, original)
+        files: List[str] = list(params.get("files") or []) + list(params.get("rollup_files") or [])
+        timings = current_timings.get()
+        phases = {}
+        if timings is not None:
+            for name, seconds in timings.phases:
+                phases[name] = round(phases.get(name, 0.0) + seconds * 1000, 1)
+        # Re-running an interrupted query would only hit the same wall
+        explain = (_explain_analyze(con, sql, params)
+                   if SLOW_QUERY_EXPLAIN and con is not None and status == "ok" else None)
+
+        from config import SessionLocal
+        import services.query_log_crud as crud
+        db = SessionLocal()
+        try:
+            crud.create_slow_query(
+                db,
+                fingerprint=fingerprint(data),
+                fingerprint_data=json.dumps(data, sort_keys=True, default=str),
+                equipment=filters.equipment,
+                dcu=filters.dcu,
+                duration_ms=round(duration_ms, 1),
+                phases=json.dumps(phases),
+                files_touched=len(files),
+                files=json.dumps(files[:SLOW_QUERY_MAX_FILES_LOGGED]),
+                rows_scanned=rows_scanned() if rows_scanned else None,
+                result_rows=result_rows,
+                explain_analyze=explain,
+                status=status
+            )
+        finally:
+            db.close()
+        logger.info(f"Slow query, {status} ({duration_ms:.0f} ms, {len(files)} files): {data}")
+    except Exception as e:
+        logger.warning(f"Failed to log slow query: {e}")
+
+def _failure_status(error: BaseException) -> str:
+    """timeout or cancelled for an interrupted query, error for anything else"""
+    if isinstance(error, (duckdb.InterruptException, QueryCancelledError)):
+        token = current_query_token.get()
+        return (token.reason if token is not None else None) or "cancelled"
+    return "error"
+
+@contextmanager
+def watch_query(filters, sql: str, params: Dict[str, Any], started: float,
+                rows_scanned: Optional[Callable[[], int]] = None, con=None, original=None) -> Iterator[Dict[str, Any]]:
+    """Run the block and log it with log_if_slow however it ends.
+
+    The block sets the yielded dict's "rows" to the result size. started is
+    the perf_counter() reading the duration is measured from.
+    """
+    outcome: Dict[str, Any] = {"rows": None}
+    status = "error"
+    try:
+        yield outcome
+        status = "ok"
+    except BaseException as e:
+        status = _failure_status(e)
+        raise
+    finally:
+        log_if_slow(filters, time.perf_counter() - started, sql, params, outcome["rows"],
+                    rows_scanned=rows_scanned, con=con, original=original, status=status)
@@ -0,0 +1,10 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# config opens the metadata database on import; keep tests off the real one
+os.environ.setdefault("SQLITE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="amstest-"), "meta.sqlite3"))
@@ -0,0 +1,78 @@
+# tests/test_batch_queries.py
+import os
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import services.duckdb_engine as duckdb_engine
+import services.duckdb_service as duckdb_service
+from models.filters import QueryFilters
+from services.duckdb_engine import DuckDBEngine
+from services.duckdb_service import query_parquet_batch, query_parquet_data
+from services.parquet_catalog import ParquetCatalog
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = DuckDBEngine(pool_size=2)
+    # Lazy rollup builds use the shared engine
+    monkeypatch.setattr(duckdb_engine, "_engine", engine)
+    yield engine
+    engine.close()
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    base_path = os.path.join(str(tmp_path), "raw")
+    monkeypatch.setattr(duckdb_service, "ROLLUP_PARQUET_PATH", os.path.join(str(tmp_path), "rollups"))
+    for day in (1, 2):
+        leaf_dir = os.path.join(base_path, "year=2025", "month=01", f"day={day:02d}", "equipment=bsc", "dcu=1")
+        os.makedirs(leaf_dir)
+        times = [datetime(2025, 1, day) + timedelta(minutes=i) for i in range(24 * 60)]
+        pq.write_table(pa.table({"t_sampling_time": pa.array(times, pa.timestamp("us")),
+                                 "n_bank": [1, 2] * (len(times) // 2), "n_rack": [1] * len(times),
+                                 "n_soc": [float(i % 60) for i in range(len(times))],
+                                 "n_soh": [float(day)] * len(times)}),
+                       os.path.join(leaf_dir, "part-0.parquet"))
+    return ParquetCatalog(base_path)
+
+
+def day_filters(**update):
+    base = QueryFilters(year=None, month=None, day=None, equipment="bsc", dcu=1,
+                        start_time="2025-01-01T00:00:00Z", end_time="2025-01-02T23:59:59Z",
+                        metrics=["n_soc"], window_period="1 hour", where_args=None)
+    return base.model_copy(update=update)
+
+
+def test_batch_members_a_rollup_answers_read_the_rollup(engine, catalog, monkeypatch):
+    scans = []
+    shared_scan = duckdb_service._run_shared_scan
+    monkeypatch.setattr(duckdb_service, "_run_shared_scan",
+                        lambda members, *args, **kwargs: scans.append(len(members)) or shared_scan(members, *args, **kwargs))
+    members = [day_filters(), day_filters(metrics=["n_soh"], where_args=["n_bank = 2"])]
+
+    frames = query_parquet_batch(members, engine, catalog)
+
+    assert scans == [1, 1]
+    assert os.path.isdir(duckdb_service.ROLLUP_PARQUET_PATH)
+    for filters, frame in zip(members, frames):
+        expected = query_parquet_data(filters, engine, catalog)
+        assert frame.to_dict("records") == expected.to_dict("records")
+        assert len(frame) == 48
+
+
+def test_batch_members_without_a_rollup_share_one_scan(engine, catalog, monkeypatch):
+    scans = []
+    shared_scan = duckdb_service._run_shared_scan
+    monkeypatch.setattr(duckdb_service, "_run_shared_scan",
+                        lambda members, *args, **kwargs: scans.append(len(members)) or shared_scan(members, *args, **kwargs))
+    # No rollup exists and none gets built, so both members read the raw files
+    monkeypatch.setattr(duckdb_service, "ROLLUP_LAZY_BUILD", False)
+    members = [day_filters(where_args=["n_bank = 2"]), day_filters(metrics=["n_soh"])]
+
+    frames = query_parquet_batch(members, engine, catalog)
+
+    assert scans == [2]
+    assert [len(frame) for frame in frames] == [48, 48]
@@ -0,0 +1,76 @@
+# tests/test_compaction.py
+import os
+import time
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from services.compaction_service import compact_leaf
+from services.duckdb_engine import DuckDBEngine
+from services.parquet_catalog import ParquetCatalog
+
+SORT_COLUMNS = ["n_bank", "n_rack", "t_sampling_time"]
+TIMES = [datetime(2025, 1, 1) + timedelta(minutes=i) for i in range(10)]
+
+
+@pytest.fixture
+def engine():
+    engine = DuckDBEngine(pool_size=1)
+    yield engine
+    engine.close()
+
+
+def write(leaf_dir: str, name: str, **columns):
+    os.makedirs(leaf_dir, exist_ok=True)
+    pq.write_table(pa.table({"t_sampling_time": pa.array(TIMES, pa.timestamp("us")), **columns}),
+                   os.path.join(leaf_dir, name))
+    # Distinct mtimes keep "newest file wins" deterministic
+    time.sleep(0.01)
+
+
+def compact(engine, base_path, leaf_dir, **kwargs):
+    catalog = ParquetCatalog(base_path)
+    catalog.refresh()
+    stats = compact_leaf(engine, catalog, leaf_dir, SORT_COLUMNS, 8, 1024, 1 << 20, **kwargs)
+    soc = engine.execute(f"SELECT n_soc FROM read_parquet('{leaf_dir}/compacted-*.parquet', union_by_name = true)")
+    return stats, [row[0] for row in soc]
+
+
+def leaf(tmp_path) -> str:
+    return os.path.join(str(tmp_path), "year=2025", "month=01", "day=01", "equipment=bsc", "dcu=1")
+
+
+def test_rows_differing_in_a_column_outside_the_sort_key_are_kept(tmp_path, engine):
+    leaf_dir = leaf(tmp_path)
+    for n_module in (1, 2):
+        write(leaf_dir, f"module-{n_module}.parquet", n_bank=[1] * 10, n_rack=[1] * 10,
+              n_module=[n_module] * 10, n_soc=[float(n_module)] * 10)
+    write(leaf_dir, "module-1-again.parquet", n_bank=[1] * 10, n_rack=[1] * 10, n_module=[1] * 10, n_soc=[1.0] * 10)
+    stats, _ = compact(engine, str(tmp_path), leaf_dir)
+    assert (stats["rows_before"], stats["rows_after"]) == (30, 20)
+
+
+def test_files_without_a_sort_column_are_not_collapsed(tmp_path, engine):
+    leaf_dir = leaf(tmp_path)
+    write(leaf_dir, "racks.parquet", n_bank=[1] * 10, n_soc=[1.0] * 10)
+    write(leaf_dir, "racks-2.parquet", n_bank=[1] * 10, n_soc=[2.0] * 10)
+    stats, _ = compact(engine, str(tmp_path), leaf_dir)
+    assert stats["rows_after"] == 20
+
+
+def test_key_columns_keep_the_newest_copy(tmp_path, engine):
+    leaf_dir = leaf(tmp_path)
+    write(leaf_dir, "old.parquet", n_bank=[1] * 10, n_rack=[1] * 10, n_soc=[1.0] * 10)
+    write(leaf_dir, "new.parquet", n_bank=[1] * 10, n_rack=[1] * 10, n_soc=[2.0] * 10)
+    stats, soc = compact(engine, str(tmp_path), leaf_dir, key_columns=SORT_COLUMNS)
+    assert stats["rows_after"] == 10
+    assert set(soc) == {2.0}
+
+
+def test_missing_key_columns_fail_instead_of_narrowing_the_key(tmp_path, engine):
+    leaf_dir = leaf(tmp_path)
+    write(leaf_dir, "racks.parquet", n_bank=[1] * 10, n_soc=[1.0] * 10)
+    with pytest.raises(ValueError):
+        compact(engine, str(tmp_path), leaf_dir, key_columns=SORT_COLUMNS)
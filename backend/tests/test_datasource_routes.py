@@ -0,0 +1,10 @@
+# tests/test_datasource_routes.py
+from services.datasource_routes import _discovery_key
+
+
+def test_discovery_key_hides_connection_secrets():
+    config = {"url": "http://influx:8086", "token": "s3cr3t-token", "password": "hunter2"}
+    key = _discovery_key("tags", "influxdb", config, "battery")
+    assert "s3cr3t-token" not in key and "hunter2" not in key
+    assert key == _discovery_key("tags", "influxdb", dict(reversed(list(config.items()))), "battery")
+    assert key != _discovery_key("tags", "influxdb", dict(config, token="other"), "battery")
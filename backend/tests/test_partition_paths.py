@@ -0,0 +1,47 @@
+# tests/test_partition_paths.py
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from models.filters import QueryFilters
+from services.duckdb_service import partition_paths
+from services.parquet_catalog import ParquetCatalog
+
+
+def make_days(base_path: str, *days: str):
+    for day in days:
+        year, month, day = day.split("-")
+        leaf_dir = os.path.join(base_path, f"year={year}", f"month={month}", f"day={day}", "equipment=bsc", "dcu=1")
+        os.makedirs(leaf_dir)
+        pq.write_table(pa.table({"n_soc": [1.0]}), os.path.join(leaf_dir, "part-0.parquet"))
+
+
+def days_of(paths):
+    return [os.sep.join(p.split(os.sep)[-6:-3]) for p in paths]
+
+
+def test_range_across_new_year_ignores_explicit_year(tmp_path):
+    make_days(str(tmp_path), "2024-12-31", "2025-01-01", "2025-01-02")
+    filters = QueryFilters(year=2024, month=None, day=None, equipment="bsc", dcu=1,
+                           start_time="2024-12-31T12:00:00Z", end_time="2025-01-01T12:00:00Z",
+                           metrics=["n_soc"], window_period=None, where_args=None)
+    assert days_of(partition_paths(filters, ParquetCatalog(str(tmp_path)))) == [
+        os.path.join("year=2024", "month=12", "day=31"),
+        os.path.join("year=2025", "month=01", "day=01"),
+    ]
+
+
+def test_leaves_come_from_the_index_until_the_next_refresh(tmp_path):
+    make_days(str(tmp_path), "2025-01-01")
+    catalog = ParquetCatalog(str(tmp_path))
+    filters = QueryFilters(year=None, month=None, day=None, equipment="bsc", dcu=1,
+                           start_time="2025-01-01T00:00:00Z", end_time="2025-01-02T12:00:00Z",
+                           metrics=["n_soc"], window_period=None, where_args=None)
+    assert len(partition_paths(filters, catalog)) == 1
+
+    make_days(str(tmp_path), "2025-01-02")
+    assert len(partition_paths(filters, catalog)) == 1
+    catalog.refresh()
+    assert len(partition_paths(filters, catalog)) == 2
+    assert partition_paths(filters.model_copy(update={"dcu": 2}), catalog) == []
@@ -0,0 +1,40 @@
+# tests/test_query_filters.py
+import pytest
+
+from services.query_filters import parse_literal, parse_where_arg
+
+
+@pytest.mark.parametrize("arg, column, op, value", [
+    ("n_bank = 1", "n_bank", "=", 1),
+    ("  n_rack>=2 ", "n_rack", ">=", 2),
+    ("n_soc < 12.5", "n_soc", "<", 12.5),
+    ("n_soc <> -3", "n_soc", "!=", -3),
+    ("name = 'x'", "name", "=", "x"),
+    ("name = ''", "name", "=", ""),
+    ("name = 'it''s'", "name", "=", "it's"),
+    ("name = 'a''''b'", "name", "=", "a''b"),
+    ('name = "x"', "name", "=", "x"),
+])
+def test_parse_where_arg_simple_comparisons(arg, column, op, value):
+    condition = parse_where_arg(arg)
+    assert condition is not None
+    assert (condition.column, condition.op, condition.value) == (column, op, value)
+
+
+@pytest.mark.parametrize("arg", [
+    "name = 'x' OR name = 'y'",
+    "name = 'x' OR 'y' = 'y'",
+    "name = '''",
+    "name = 'it's'",
+    "n_bank = 1 OR n_bank = 2",
+    "n_bank = n_rack",
+    "n_bank IN (1, 2)",
+    "lower(name) = 'x'",
+])
+def test_parse_where_arg_leaves_other_sql_raw(arg):
+    assert parse_where_arg(arg) is None
+
+
+def test_parse_literal_rejects_mismatched_quotes():
+    assert parse_literal("'x\"") is None
+    assert parse_literal("'") is None
@@ -0,0 +1,97 @@
+# tests/test_slow_query_log.py
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import services.query_log_crud as crud
+import services.slow_query_log as slow_query_log
+from models.filters import QueryFilters
+from services.duckdb_engine import DuckDBEngine
+from services.duckdb_service import open_record_batch_reader, query_parquet_batch, query_parquet_data
+from services.parquet_catalog import ParquetCatalog
+from services.query_executor import QueryExecutor, QueryTimeoutError
+from services.slow_query_log import watch_query
+
+
+@pytest.fixture
+def logged(monkeypatch):
+    """Log every query and collect the records instead of storing them"""
+    records = []
+    monkeypatch.setattr(slow_query_log, "SLOW_QUERY_THRESHOLD_MS", 0)
+    monkeypatch.setattr(crud, "create_slow_query", lambda db, **fields: records.append(fields))
+    return records
+
+
+@pytest.fixture
+def engine():
+    engine = DuckDBEngine(pool_size=2)
+    yield engine
+    engine.close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    leaf_dir = os.path.join(str(tmp_path), "year=2025", "month=01", "day=01", "equipment=bsc", "dcu=1")
+    os.makedirs(leaf_dir)
+    times = [datetime(2025, 1, 1) + timedelta(minutes=i) for i in range(120)]
+    pq.write_table(pa.table({"t_sampling_time": pa.array(times, pa.timestamp("us")),
+                             "n_bank": [1, 2] * 60, "n_rack": [1] * 120,
+                             "n_soc": [float(i) for i in range(120)], "n_soh": [1.0] * 120}),
+                   os.path.join(leaf_dir, "part-0.parquet"))
+    return ParquetCatalog(str(tmp_path))
+
+
+def filters(**update):
+    base = QueryFilters(year=None, month=None, day=None, equipment="bsc", dcu=1,
+                        start_time="2025-01-01T00:00:00Z", end_time="2025-01-01T02:00:00Z",
+                        metrics=["n_soc"], window_period="1 hour", where_args=None)
+    return base.model_copy(update=update)
+
+
+def test_finished_query_is_logged_ok(logged, engine, store):
+    query_parquet_data(filters(), engine, store)
+    assert [(r["status"], r["result_rows"]) for r in logged] == [("ok", 2)]
+
+
+def test_shared_batch_scan_is_logged_once(logged, engine, store):
+    frames = query_parquet_batch([filters(), filters(metrics=["n_soh"], where_args=["n_bank = 2"])], engine, store)
+    assert len(frames) == 2
+    assert [(r["status"], r["result_rows"]) for r in logged] == [("ok", 2)]
+
+
+def test_stream_is_logged_with_streamed_rows(logged, engine, store):
+    with open_record_batch_reader(filters(), engine, store, batch_size=1) as reader:
+        assert reader.read_all().num_rows == 2
+    assert [(r["status"], r["result_rows"]) for r in logged] == [("ok", 2)]
+
+
+def test_failed_query_is_logged_as_error(logged, engine):
+    with pytest.raises(Exception):
+        with engine.cursor() as con, watch_query(filters(), "SELECT x", {}, time.perf_counter(), con=con):
+            con.execute("SELECT x").fetchall()
+    assert [r["status"] for r in logged] == ["error"]
+
+
+def test_timed_out_query_is_logged_as_timeout(logged, engine):
+    sql = "SELECT count(*) FROM range(10000000000) t(a) WHERE a % 7 = 3"
+
+    def endless():
+        with engine.cursor() as con, watch_query(filters(), sql, {}, time.perf_counter(), con=con):
+            con.execute(sql).fetchall()
+
+    executor = QueryExecutor(max_concurrency=1, poll_interval=0.05)
+    try:
+        with pytest.raises(QueryTimeoutError):
+            asyncio.run(executor.run(endless, timeout=0.3))
+        # The worker logs once DuckDB has stopped
+        deadline = time.monotonic() + 10
+        while not logged and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        executor.shutdown()
+    assert [r["status"] for r in logged] == ["timeout"]
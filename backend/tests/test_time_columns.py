@@ -0,0 +1,66 @@
+# tests/test_time_columns.py
+"""Stores that keep t_sampling_time as text are cast row by row."""
+import os
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from models.filters import QueryFilters
+from services.duckdb_engine import DuckDBEngine
+from services.duckdb_service import query_parquet_data
+from services.parquet_catalog import ParquetCatalog, read_file_stats
+
+TIMES = [datetime(2025, 1, 1) + timedelta(minutes=10 * i) for i in range(12)]
+
+
+def write_leaf(base_path: str, name: str, time_column: pa.Array):
+    leaf_dir = os.path.join(base_path, "year=2025", "month=01", "day=01", "equipment=bsc", "dcu=1")
+    os.makedirs(leaf_dir, exist_ok=True)
+    pq.write_table(pa.table({
+        "t_sampling_time": time_column,
+        "n_bank": [1] * len(TIMES),
+        "n_rack": [1] * len(TIMES),
+        "n_soc": [10.0 if t.hour == 0 else 30.0 for t in TIMES],
+    }), os.path.join(leaf_dir, name))
+    return os.path.join(leaf_dir, name)
+
+
+def text_times():
+    return pa.array([t.strftime("%Y-%m-%d %H:%M:%S") for t in TIMES], pa.string())
+
+
+@pytest.fixture
+def engine():
+    engine = DuckDBEngine(pool_size=2)
+    yield engine
+    engine.close()
+
+
+def query(base_path: str, engine: DuckDBEngine, aggregation: str = "avg"):
+    filters = QueryFilters(year=None, month=None, day=None, equipment="bsc", dcu=1,
+                           start_time="2025-01-01T00:00:00Z", end_time="2025-01-01T02:00:00Z",
+                           metrics=["n_soc"], window_period="1 hour", where_args=None, aggregation=aggregation)
+    result = query_parquet_data(filters, engine, ParquetCatalog(base_path))
+    return [(str(row.bucket_time), row.n_soc) for row in result.itertuples()]
+
+
+def test_text_time_column_is_detected(tmp_path):
+    path = write_leaf(str(tmp_path), "part-0.parquet", text_times())
+    stats = read_file_stats(path, str(tmp_path), "t_sampling_time", ("n_bank", "n_rack"))
+    assert stats.time_type == "VARCHAR"
+
+
+@pytest.mark.parametrize("aggregation", ["avg", "m4", "lttb"])
+def test_text_time_column_queries(tmp_path, engine, aggregation):
+    write_leaf(str(tmp_path), "part-0.parquet", text_times())
+    rows = query(str(tmp_path), engine, aggregation)
+    assert {bucket[:13] for bucket, _ in rows} == {"2025-01-01 00", "2025-01-01 01"}
+    assert {value for _, value in rows} == {10.0, 30.0}
+
+
+def test_text_and_timestamp_files_in_one_leaf(tmp_path, engine):
+    write_leaf(str(tmp_path), "part-0.parquet", text_times())
+    write_leaf(str(tmp_path), "part-1.parquet", pa.array(TIMES, pa.timestamp("us")))
+    assert query(str(tmp_path), engine) == [("2025-01-01 00:00:00", 10.0), ("2025-01-01 01:00:00", 30.0)]
@@ -0,0 +1,56 @@
+# tests/test_time_zone.py
+"""Bucketing of TIMESTAMPTZ stores must not depend on the host time zone."""
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from conftest import BACKEND_DIR
+
+
+def write_tz_store(base_path: str):
+    """One leaf with ten-minute samples stored tz-aware: 10.0 during 00:00 UTC, 30.0 during 01:00"""
+    leaf_dir = os.path.join(base_path, "year=2025", "month=01", "day=01", "equipment=bsc", "dcu=1")
+    os.makedirs(leaf_dir, exist_ok=True)
+    times = [datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=10 * i) for i in range(12)]
+    pq.write_table(pa.table({
+        "t_sampling_time": pa.array(times, pa.timestamp("us", tz="UTC")),
+        "n_bank": [1] * len(times),
+        "n_rack": [1] * len(times),
+        "n_soc": [10.0 if t.hour == 0 else 30.0 for t in times],
+    }), os.path.join(leaf_dir, "part-0.parquet"))
+
+
+def hourly_soc(base_path: str, pool_size: int = 2):
+    from models.filters import QueryFilters
+    from services.duckdb_engine import DuckDBEngine
+    from services.duckdb_service import query_parquet_data
+    from services.parquet_catalog import ParquetCatalog
+
+    filters = QueryFilters(year=None, month=None, day=None, equipment="bsc", dcu=1,
+                           start_time="2025-01-01T00:00:00Z", end_time="2025-01-01T02:00:00Z",
+                           metrics=["n_soc"], window_period="1 hour", where_args=None)
+    engine = DuckDBEngine(pool_size=pool_size)
+    try:
+        result = query_parquet_data(filters, engine, ParquetCatalog(base_path))
+    finally:
+        engine.close()
+    return [(str(row.bucket_time), row.n_soc) for row in result.itertuples()]
+
+
+def test_pooled_cursors_bucket_in_utc_under_non_utc_host_zone(tmp_path):
+    write_tz_store(str(tmp_path))
+    env = dict(os.environ, TZ="America/New_York")
+    # DuckDB reads the host zone when the database opens, so run in a fresh interpreter
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), str(tmp_path)],
+                          cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120)
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip().splitlines()[-1] == repr([("2025-01-01 00:00:00", 10.0),
+                                                         ("2025-01-01 01:00:00", 30.0)])
+
+
+if __name__ == "__main__":
+    print(repr(hourly_soc(sys.argv[1])))